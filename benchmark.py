@@ -0,0 +1,439 @@
+"""Offline benchmarks for the bot's hot paths, run against synthetic in-memory guilds.
+
+Examples:
+    python benchmark.py                                   # default sizes, print a table
+    python benchmark.py --sizes 10,1000,50000 -o results.json
+    python benchmark.py --compare results.json            # exit 1 if anything got slower
+    python benchmark.py --sizes 10 --dm-sizes 10 --memory-sizes 100000   # member cache modes only
+
+Nothing talks to Discord: channels, roles and overwrites are lightweight subclasses of
+the discord.py models (so isinstance checks and the real `overwrites`/`category`
+properties still run), and DMs go to a fake transport with configurable latency and
+429 injection.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# Keep the bot module from creating a reminders database next to the benchmark
+os.environ.setdefault('REMINDER_DB_PATH', ':memory:')
+os.environ.setdefault('OUTBOX_DB_PATH', ':memory:')
+
+import discord
+from discord.abc import _Overwrites
+
+import main
+from delivery import DeliveryEngine, TokenBucket
+from indexes import GroupChatIndex, RoleMemberIndex, scan_GCs
+from member_cache import MemberLRU, fetch_role_members
+
+DEFAULT_SIZES = '10,100,1000,10000,50000'
+DEFAULT_DM_SIZES = '10,100,1000,10000'
+DEFAULT_MEMORY_SIZES = '1000,10000,100000'
+
+
+# --- Synthetic guild fixtures ---
+
+class FakeRole(discord.Role):
+    def __init__(self, guild, role_id, name):
+        self.guild = guild
+        self.id = role_id
+        self.name = name
+
+
+class FakeCategory(discord.CategoryChannel):
+    def __init__(self, guild, channel_id, name):
+        self.guild = guild
+        self.id = channel_id
+        self.name = name
+        self.category_id = None
+
+
+class FakeTextChannel(discord.TextChannel):
+    def __init__(self, guild, channel_id, name, category_id, overwrites):
+        self.guild = guild
+        self.id = channel_id
+        self.name = name
+        self.category_id = category_id
+        self._overwrites = [_Overwrites({'id': target_id, 'allow': 1024, 'deny': 0, 'type': _Overwrites.ROLE})
+                            for target_id in overwrites]
+
+
+class FakeTransport:
+    """Stands in for the Discord API: fixed latency plus an optional share of 429 responses."""
+
+    class _Response:
+        def __init__(self, status, retry_after):
+            self.status = status
+            self.reason = 'Too Many Requests'
+            self.headers = {'Retry-After': str(retry_after)}
+
+    def __init__(self, latency=0.0, rate_limit_probability=0.0, retry_after=0.05, seed=0):
+        self.latency = latency
+        self.rate_limit_probability = rate_limit_probability
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.sent = 0
+        self.rate_limited = 0
+
+    async def request(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.rate_limit_probability and self.random.random() < self.rate_limit_probability:
+            self.rate_limited += 1
+            raise discord.HTTPException(self._Response(429, self.retry_after), 'You are being rate limited.')
+
+    async def send(self, content):
+        await self.request()
+        self.sent += 1
+
+
+class FakeMember:
+    __slots__ = ('guild', 'id', 'name', 'bot', 'dm_channel', '_roles', '_transport')
+
+    def __init__(self, guild, member_id, name, role_ids, transport):
+        self.guild = guild
+        self.id = member_id
+        self.name = name
+        self.bot = False
+        self.dm_channel = None
+        self._roles = role_ids
+        self._transport = transport
+
+    async def create_dm(self):
+        await self._transport.request()
+        self.dm_channel = self
+        return self
+
+    async def send(self, content):
+        await self._transport.send(content)
+
+
+class FakeGuild:
+    """A guild with `size` channels and `size` members.
+
+    A third of the channels are '-group-chat' channels spread over a few categories,
+    each with overwrites for its team role plus a couple of unrelated roles. With
+    `cache_members=False` the members aren't kept (like MEMBER_CACHE=lean) and are only
+    produced by `fetch_members`.
+    """
+
+    def __init__(self, size, transport=None, seed=0, cache_members=True):
+        rng = random.Random(seed)
+        self.id = 1
+        self.name = f"synthetic-{size}"
+        self._channels = {}
+        self._roles = {}
+        self._members = {}
+        next_id = iter(range(10_000, 10**12))
+
+        self._roles[self.id] = FakeRole(self, self.id, '@everyone')
+        staff = FakeRole(self, next(next_id), 'Staff')
+        self._roles[staff.id] = staff
+        categories = []
+        for i in range(max(1, size // 500)):
+            category = FakeCategory(self, next(next_id), f"Category {i}")
+            self._channels[category.id] = category
+            categories.append(category)
+
+        team_roles = []
+        for i in range(size):
+            if i % 3 == 0:
+                team = FakeRole(self, next(next_id), f"Team {i}")
+                self._roles[team.id] = team
+                team_roles.append(team)
+                channel = FakeTextChannel(self, next(next_id), f"team-{i}-group-chat",
+                                          rng.choice(categories).id, [self.id, staff.id, team.id])
+            else:
+                channel = FakeTextChannel(self, next(next_id), f"general-{i}", rng.choice(categories).id, [self.id])
+            self._channels[channel.id] = channel
+
+        self.staff_role = staff
+        self._size = size
+        self._team_role_ids = [role.id for role in team_roles]
+        self._first_member_id = next(next_id)
+        self._member_seed = seed
+        self._transport = transport or FakeTransport()
+        if cache_members:
+            self._members = {member.id: member for member in self._generate_members()}
+
+    def _generate_members(self):
+        """The guild's members, generated deterministically (the same ones on every call)."""
+        rng = random.Random(self._member_seed)
+        for i in range(self._size):
+            roles = [rng.choice(self._team_role_ids) for _ in range(rng.randint(1, 3))] if self._team_role_ids else []
+            if i % 50 == 0:
+                roles.append(self.staff_role.id)
+            yield FakeMember(self, self._first_member_id + i, f"member{i}", roles, self._transport)
+
+    async def fetch_members(self, limit=None):
+        """Like Guild.fetch_members: members are produced as they're "received", nothing is kept."""
+        for member in self._generate_members():
+            yield member
+
+    @property
+    def channels(self):
+        return list(self._channels.values())
+
+    @property
+    def roles(self):
+        return list(self._roles.values())
+
+    @property
+    def members(self):
+        return list(self._members.values())
+
+    def get_channel(self, channel_id):
+        return self._channels.get(channel_id)
+
+    def get_role(self, role_id):
+        return self._roles.get(role_id)
+
+    def get_member(self, member_id):
+        return self._members.get(member_id)
+
+
+# --- Timing ---
+
+def time_sync(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def time_async(make_coro, repeat):
+    async def run():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await make_coro()
+            timings.append(time.perf_counter() - start)
+        return timings
+    return asyncio.run(run())
+
+
+def summarize_timings(timings, items=None):
+    result = {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'runs': len(timings),
+    }
+    if items:
+        result['items_per_second'] = items / result['median'] if result['median'] else None
+    return result
+
+
+# --- Benchmarks ---
+
+def bench_get_GCs(size, repeat):
+    guild = FakeGuild(size)
+    index = GroupChatIndex()
+    index.build(guild)
+    return {
+        'get_GCs (full scan)': summarize_timings(time_sync(lambda: scan_GCs(guild), repeat)),
+        'get_GCs (index build)': summarize_timings(time_sync(lambda: GroupChatIndex().build(guild), repeat)),
+        'get_GCs (indexed lookup)': summarize_timings(time_sync(lambda: index.get_GCs(guild), repeat)),
+    }
+
+
+def bench_format_GCs_results(size, repeat):
+    results = scan_GCs(FakeGuild(size))
+    return {
+        'format_GCs_results': summarize_timings(time_sync(lambda: main.format_GCs_results(results), repeat)),
+        'format_GCs_pages': summarize_timings(time_sync(lambda: main.format_GCs_pages(results), repeat)),
+    }
+
+
+def bench_mentions(size, repeat):
+    roles = ' '.join(f"<@&{100000 + i}>" for i in range(size))
+    users = ' '.join(f"<@{'!' if i % 2 else ''}{100000 + i}>" for i in range(size))
+    return {
+        'get_mentions_asid': summarize_timings(time_sync(lambda: main.get_mentions_asid(roles), repeat)),
+        'get_user_mentions_asid': summarize_timings(time_sync(lambda: main.get_user_mentions_asid(users), repeat)),
+    }
+
+
+def bench_dm_fanout(size, repeat, args):
+    transport = FakeTransport(latency=args.latency, rate_limit_probability=args.rate_limit_probability,
+                              retry_after=args.retry_after)
+    guild = FakeGuild(size, transport=transport)
+    members = guild.members
+
+    async def fan_out():
+        main.DELIVERY_MODE = 'inline'
+        main.global_bucket = TokenBucket(args.dm_rate)
+        main.dm_engine = DeliveryEngine(rate=args.dm_rate, concurrency=args.dm_concurrency,
+                                        base_backoff=args.retry_after, global_bucket=main.global_bucket)
+        # The bot's DM path: recorded in the (in-memory) outbox, then sent and recorded per recipient
+        _, counts = await main.dm_campaign(guild, "benchmark", members, source='benchmark', retry_closed=True)
+        assert sum(counts.values()) == len(members)
+
+    timings = time_async(fan_out, repeat)
+    result = summarize_timings(timings, items=size)
+    result['rate_limited'] = transport.rate_limited
+    result['retry_overhead'] = transport.rate_limited / max(1, transport.sent)
+    return {'dm fan-out (dm_campaign)': result}
+
+
+def measure_memory(fn):
+    """(bytes still allocated after fn() returns, peak bytes while it ran); keeps fn's result alive."""
+    tracemalloc.start()
+    try:
+        kept = fn()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del kept
+    return {'retained_bytes': current, 'peak_bytes': peak}
+
+
+def bench_member_memory(size, args):
+    """Member memory in the two MEMBER_CACHE modes, for a DM audience of the Staff role.
+
+    Channels and roles are created before measuring, so only member-related memory counts.
+    FakeMember is much smaller than a real discord.Member, so absolute numbers understate
+    both modes; the ratio between them is what matters.
+    """
+    full_guild = FakeGuild(size, cache_members=False)
+    lean_guild = FakeGuild(size, cache_members=False)
+
+    def full():
+        # What chunking at startup leaves behind, plus the role index built over it
+        full_guild._members = {member.id: member for member in full_guild._generate_members()}
+        index = RoleMemberIndex()
+        index.build(full_guild)
+        return index, [full_guild.get_member(member_id) for member_id in index.query(full_guild, [full_guild.staff_role.id])]
+
+    def lean():
+        lru = MemberLRU(args.lru_size)
+        audience = asyncio.run(fetch_role_members(lean_guild, [lean_guild.staff_role.id]))
+        for member in audience:
+            lru.put(member)
+        return lru, audience
+
+    return {
+        'member memory (full cache)': measure_memory(full),
+        'member memory (lean)': measure_memory(lean),
+    }
+
+
+def run(args):
+    results = {}
+
+    def record(size, timings):
+        for name, summary in timings.items():
+            results.setdefault(name, {})[str(size)] = summary
+            print(f"{name:<32} {size:>7}  median {summary['median'] * 1000:10.3f} ms"
+                  + (f"  ({summary['items_per_second']:.0f}/s)" if summary.get('items_per_second') else ''))
+
+    for size in args.sizes:
+        record(size, bench_get_GCs(size, args.repeat))
+        record(size, bench_format_GCs_results(size, args.repeat))
+        record(size, bench_mentions(size, args.repeat))
+    for size in args.dm_sizes:
+        record(size, bench_dm_fanout(size, args.dm_repeat, args))
+    for size in args.memory_sizes:
+        for name, summary in bench_member_memory(size, args).items():
+            results.setdefault(name, {})[str(size)] = summary
+            print(f"{name:<32} {size:>7}  retained {summary['retained_bytes'] / 2**20:8.2f} MiB"
+                  f"  peak {summary['peak_bytes'] / 2**20:8.2f} MiB")
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """Print median ratios against a previous run; returns the number of regressions."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    regressions = 0
+    print(f"\nCompared with {baseline_path} (regression threshold x{threshold}):")
+    for name, sizes in results.items():
+        for size, summary in sizes.items():
+            key = 'median' if 'median' in summary else 'retained_bytes'
+            old = baseline.get(name, {}).get(size)
+            if not old or not old.get(key):
+                continue
+            ratio = summary[key] / old[key]
+            flag = 'REGRESSION' if ratio > threshold else ''
+            regressions += bool(flag)
+            print(f"{name:<32} {size:>7}  x{ratio:6.2f} {flag}")
+    return regressions
+
+
+def parse_sizes(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=parse_sizes, default=parse_sizes(DEFAULT_SIZES),
+                        help=f"Channel/member counts for the CPU benchmarks (default: {DEFAULT_SIZES})")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per CPU benchmark (default: 5)")
+    parser.add_argument('--dm-sizes', type=parse_sizes, default=parse_sizes(DEFAULT_DM_SIZES),
+                        help=f"Recipient counts for the DM fan-out benchmark (default: {DEFAULT_DM_SIZES})")
+    parser.add_argument('--dm-repeat', type=int, default=1, help="Runs per DM fan-out benchmark (default: 1)")
+    parser.add_argument('--dm-rate', type=float, default=1e9, help="DM token bucket rate per second (default: unlimited)")
+    parser.add_argument('--dm-concurrency', type=int, default=8, help="DM worker pool size (default: 8)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Simulated seconds per send (default: 0)")
+    parser.add_argument('--rate-limit-probability', type=float, default=0.0,
+                        help="Share of sends that get a 429 (default: 0)")
+    parser.add_argument('--retry-after', type=float, default=0.01, help="retry_after on injected 429s (default: 0.01)")
+    parser.add_argument('--memory-sizes', type=parse_sizes, default=parse_sizes(DEFAULT_MEMORY_SIZES),
+                        help=f"Member counts for the member cache memory benchmark (default: {DEFAULT_MEMORY_SIZES})")
+    parser.add_argument('--lru-size', type=int, default=5000, help="Member LRU size in lean mode (default: 5000)")
+    parser.add_argument('-o', '--output', help="Write results as JSON to this file")
+    parser.add_argument('--compare', metavar='BASELINE', help="Compare against a previous JSON result")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="Slowdown ratio counted as a regression with --compare (default: 1.25)")
+    return parser.parse_args(argv)
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    logging.getLogger().setLevel(logging.ERROR)  # Per-recipient log lines would dominate the timings
+    results = run(args)
+
+    if args.output:
+        payload = {
+            'meta': {
+                'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'discord_py': discord.__version__,
+                'args': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+            },
+            'results': results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -0,0 +1,63 @@
+"""Application command sync that skips the request when the command tree hasn't changed.
+
+Syncing is a bulk overwrite of every command and is rate limited, so instead of syncing
+on every start the serialized tree is hashed and compared with the hash stored after the
+last successful sync (a small JSON file, one entry per application and scope).
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import Optional
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+
+def tree_hash(tree: discord.app_commands.CommandTree, guild: Optional[discord.abc.Snowflake] = None) -> str:
+    """SHA-256 of the payload a sync of `tree` (globally, or for `guild`) would send."""
+    payload = sorted((command.to_dict(tree) for command in tree.get_commands(guild=guild)),
+                     key=lambda command: (command.get('type', 1), command['name']))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _load_state(path: str) -> dict:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable command sync state {path}: {e}")
+        return {}
+
+
+def _save_state(path: str, state: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+async def sync_if_changed(tree: discord.app_commands.CommandTree, state_path: str,
+                          guild: Optional[discord.abc.Snowflake] = None, force: bool = False) -> Optional[list]:
+    """Sync `tree` globally (or to `guild`) unless it matches the last synced hash.
+
+    Returns the synced commands, or None if the sync was skipped.
+    """
+    scope = f"guild:{guild.id}" if guild else 'global'
+    key = f"{tree.client.application_id}:{scope}"
+    digest = tree_hash(tree, guild)
+    state = _load_state(state_path)
+    if not force and state.get(key) == digest:
+        logger.info(f"Command tree unchanged ({scope}), skipping sync.")
+        return None
+
+    synced = await tree.sync(guild=guild)
+    state[key] = digest
+    try:
+        _save_state(state_path, state)
+    except OSError as e:
+        logger.warning(f"Could not save command sync state to {state_path}: {e}")
+    return synced
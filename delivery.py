@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, Optional, TypeVar
+
+import aiohttp
+import discord
+
+from metrics import RATE_LIMITED, RETRY_AFTER_SECONDS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Delivery outcomes
+SENT = 'sent'
+FORBIDDEN = 'forbidden'  # DMs closed / blocked; retrying won't help
+FAILED = 'failed'
+SKIPPED = 'skipped'  # e.g. bots
+SUPPRESSED = 'suppressed'  # Not attempted: the recipient's DMs were recently found closed
+
+# JSON error code for "Cannot send messages to this user" (sometimes a 400 rather than a 403)
+CANNOT_MESSAGE_USER = 50007
+
+# Discord allows 50 requests/s per bot globally; stay a little under it
+DISCORD_GLOBAL_RATE = 45.0
+
+
+@dataclass
+class DeliveryResult:
+    """Outcome of delivering one message to one recipient."""
+    recipient_id: int
+    status: str
+    attempts: int = 0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == SENT
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursting up to `capacity`.
+
+    `pause()` blocks every caller until a deadline, which is how a global 429 is honoured.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated: Optional[float] = None
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        loop = asyncio.get_running_loop()
+        self._blocked_until = max(self._blocked_until, loop.time() + seconds)
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        async with self._lock:  # FIFO: callers are served in arrival order
+            while True:
+                now = loop.time()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                if self._updated is not None:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _retry_after(error: discord.HTTPException) -> tuple[Optional[float], bool]:
+    """(retry_after seconds, is_global) for a 429, read from the response headers."""
+    headers = getattr(error.response, 'headers', None) or {}
+    retry_after = headers.get('Retry-After')
+    is_global = headers.get('X-RateLimit-Global', '').lower() == 'true' or headers.get('X-RateLimit-Scope') == 'global'
+    try:
+        return (float(retry_after) if retry_after is not None else None), is_global
+    except ValueError:
+        return None, is_global
+
+
+class DeliveryEngine:
+    """Sends messages through a bounded worker pool, paced by token buckets.
+
+    Each send is retried on 429s (honouring `retry_after`) and on transient errors
+    (5xx, connection errors) with jittered exponential backoff. Every recipient gets
+    a DeliveryResult.
+    """
+
+    def __init__(self, rate: float, concurrency: int = 8, max_attempts: int = 5,
+                 base_backoff: float = 1.0, max_backoff: float = 60.0,
+                 global_bucket: Optional[TokenBucket] = None):
+        self.bucket = TokenBucket(rate)
+        self.global_bucket = global_bucket
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+    async def acquire_global(self):
+        """Take a global token for an extra request made inside a send (e.g. opening a DM channel)."""
+        if self.global_bucket is not None:
+            await self.global_bucket.acquire()
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter" exponential backoff
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+
+    async def send_one(self, recipient_id: int, send: Callable[[], Awaitable]) -> DeliveryResult:
+        """Run `send()` with pacing and retries, classifying the outcome.
+
+        Retries are logged at DEBUG only; they're counted in the metrics and in
+        result.attempts.
+        """
+        result = DeliveryResult(recipient_id, FAILED)
+        while result.attempts < self.max_attempts:
+            result.attempts += 1
+            if self.global_bucket is not None:
+                await self.global_bucket.acquire()
+            await self.bucket.acquire()
+            try:
+                await send()
+                result.status, result.error = SENT, None
+                return result
+            except discord.Forbidden as e:
+                result.status, result.error = FORBIDDEN, str(e)
+                return result
+            except discord.NotFound as e:
+                result.status, result.error = FAILED, str(e)
+                return result
+            except discord.RateLimited as e:
+                # discord.py gave up waiting because retry_after exceeded max_ratelimit_timeout
+                result.error = f"Rate limited ({e.retry_after:.2f}s)"
+                RATE_LIMITED.inc(scope='route')
+                RETRY_AFTER_SECONDS.inc(e.retry_after)
+                self.bucket.pause(e.retry_after)
+                logger.debug("Rate limited sending to %s, retrying in %.2fs.", recipient_id, e.retry_after)
+                continue
+            except discord.HTTPException as e:
+                result.error = f"HTTP {e.status}: {e.text or e}"
+                if e.code == CANNOT_MESSAGE_USER:
+                    result.status = FORBIDDEN
+                    return result
+                if e.status == 429:
+                    retry_after, is_global = _retry_after(e)
+                    delay = retry_after if retry_after is not None else self._backoff(result.attempts)
+                    RATE_LIMITED.inc(scope='global' if is_global else 'route')
+                    RETRY_AFTER_SECONDS.inc(delay)
+                    (self.global_bucket if is_global and self.global_bucket else self.bucket).pause(delay)
+                    logger.debug("Rate limited sending to %s, retrying in %.2fs (global=%s).", recipient_id, delay, is_global)
+                    continue
+                if e.status < 500:
+                    return result  # Client error; retrying won't help
+                delay = self._backoff(result.attempts)
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                result.error = f"{type(e).__name__}: {e}"
+                delay = self._backoff(result.attempts)
+            if result.attempts < self.max_attempts:
+                logger.debug("Transient error sending to %s (%s), retrying in %.2fs.", recipient_id, result.error, delay)
+                await asyncio.sleep(delay)
+        return result
+
+    async def deliver(self, recipients: Iterable[T], send: Callable[[T], Awaitable[DeliveryResult]]) -> list[DeliveryResult]:
+        """Deliver to every recipient with at most `concurrency` sends in flight.
+
+        `send(recipient)` is expected to return a DeliveryResult (usually via `send_one`).
+        Results are returned in input order.
+        """
+        recipients = list(recipients)
+        results: list[Optional[DeliveryResult]] = [None] * len(recipients)
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in enumerate(recipients):
+            queue.put_nowait(item)
+
+        async def worker():
+            while True:
+                try:
+                    index, recipient = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    results[index] = await send(recipient)
+                except Exception as e:
+                    logger.error(f"Unexpected error delivering to {getattr(recipient, 'id', recipient)}: {e}", exc_info=True)
+                    results[index] = DeliveryResult(getattr(recipient, 'id', 0), FAILED, error=str(e))
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, len(recipients)))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for w in workers:
+                w.cancel()
+        return results
+
@@ -0,0 +1,476 @@
+"""Local stand-in for the Discord REST API and gateway, for load-testing fan-outs end to end.
+
+It speaks enough of both for discord.py to log in, connect, receive synthetic guilds
+(members are sent in GUILD_MEMBERS_CHUNKs when requested), respond to interactions and
+post channel messages and DMs. Per-route and global rate limits are enforced the way
+Discord does it: X-RateLimit-* headers on every response, and 429s with `retry_after`
+once a bucket is empty. Every request is recorded with its route, status and duration.
+
+Point discord.py at it with `FakeDiscord.install()` (patches Route.BASE and the default
+gateway URL); see loadtest.py for a runner that drives the bot's commands through it.
+"""
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Optional
+
+import yarl
+from aiohttp import WSMsgType, web
+
+logger = logging.getLogger(__name__)
+
+API_VERSION = 10
+HEARTBEAT_INTERVAL_MS = 41250
+CHUNK_SIZE = 1000  # Members per GUILD_MEMBERS_CHUNK, as Discord does
+ADMINISTRATOR = 1 << 3
+VIEW_CHANNEL = 1 << 10
+
+# Gateway opcodes
+DISPATCH, HEARTBEAT, IDENTIFY, RESUME, REQUEST_MEMBERS, HELLO, HEARTBEAT_ACK = 0, 1, 2, 6, 8, 10, 11
+
+
+def _timestamp() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def _json_response(data, status: int = 200, headers: Optional[dict] = None) -> web.Response:
+    # discord.py only decodes bodies whose Content-Type is exactly application/json (no charset)
+    return web.Response(body=json.dumps(data).encode('utf-8'), status=status,
+                        headers={**(headers or {}), 'Content-Type': 'application/json'})
+
+
+class RateLimiter:
+    """Fixed-window buckets: `limit` requests per `per` seconds for each key."""
+
+    def __init__(self, limit: int, per: float):
+        self.limit = limit
+        self.per = per
+        self._windows: dict = {}  # key -> [window start, count]
+
+    def hit(self, key, now: float) -> tuple[bool, int, float]:
+        """Count a request. Returns (allowed, remaining, seconds until the window resets)."""
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.per:
+            window = self._windows[key] = [now, 0]
+        reset_after = self.per - (now - window[0])
+        if window[1] >= self.limit:
+            return False, 0, reset_after
+        window[1] += 1
+        return True, self.limit - window[1], reset_after
+
+
+@dataclass
+class RequestRecord:
+    method: str
+    route: str
+    status: int
+    started: float
+    duration: float
+
+
+@dataclass
+class SyntheticGuild:
+    """A guild whose members all have the 'Load Test' role, plus `channels` group chat
+    channels ("team-N-group-chat") each with a "Team N" role overwrite.
+
+    A `closed_dm_share` of the members have their DMs closed (403, code 50007).
+    """
+    id: int
+    name: str
+    member_ids: list[int]
+    closed_dm_ids: set[int]
+    roles: list[dict]
+    channels: list[dict]
+    load_test_role_id: int
+    team_role_ids: list[int]
+
+    def member_roles(self, user_id: int) -> list[str]:
+        roles = [str(self.load_test_role_id)]
+        if self.team_role_ids:
+            roles.append(str(self.team_role_ids[user_id % len(self.team_role_ids)]))
+        return roles
+
+
+@dataclass
+class PendingInteraction:
+    id: int
+    token: str
+    dispatched_at: float
+    acked_at: Optional[float] = None
+    messages: list[str] = field(default_factory=list)
+    message_event: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class FakeDiscord:
+    def __init__(self, *, global_rate: int = 50, channel_rate: tuple[int, float] = (5, 5.0),
+                 latency: float = 0.0, seed: int = 0):
+        self.global_limiter = RateLimiter(global_rate, 1.0)
+        self.channel_limiter = RateLimiter(*channel_rate)
+        self.latency = latency
+        self.random = random.Random(seed)
+        self._ids = itertools.count(1_000_000_000_000_000)
+        self.application_id = next(self._ids)
+        self.bot_user = self._user(self.application_id, 'loadtest-bot', bot=True)
+        self.admin_id = next(self._ids)
+        self.guilds: dict[int, SyntheticGuild] = {}
+        self.users: dict[int, int] = {}  # user id -> guild id
+        self.dm_channels: dict[int, int] = {}  # DM channel id -> user id
+        self.requests: list[RequestRecord] = []
+        self.delivered: list[tuple[float, str, int]] = []  # (time, 'dm'/'channel', recipient id)
+        self.rate_limited: defaultdict[str, int] = defaultdict(int)
+        self.interactions: dict[int, PendingInteraction] = {}
+        self._sockets: list = []
+        self._sequence = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = None
+
+    # --- Fixtures ---
+
+    def _user(self, user_id: int, name: str, bot: bool = False) -> dict:
+        return {'id': str(user_id), 'username': name, 'discriminator': '0', 'global_name': None,
+                'avatar': None, 'bot': bot, 'public_flags': 0}
+
+    def _member(self, guild: SyntheticGuild, user_id: int) -> dict:
+        if user_id == self.admin_id:
+            roles = []
+        elif user_id == self.application_id:
+            roles = []
+        else:
+            roles = guild.member_roles(user_id)
+        return {'user': self._user(user_id, f"user{user_id}", bot=user_id == self.application_id), 'roles': roles,
+                'joined_at': _timestamp(), 'deaf': False, 'mute': False, 'flags': 0, 'nick': None,
+                'avatar': None, 'premium_since': None, 'pending': False}
+
+    def add_guild(self, members: int, channels: int = 0, closed_dm_share: float = 0.0) -> SyntheticGuild:
+        guild_id = next(self._ids)
+        roles = [{'id': str(guild_id), 'name': '@everyone', 'permissions': '0', 'position': 0}]
+        load_test_role_id = next(self._ids)
+        roles.append({'id': str(load_test_role_id), 'name': 'Load Test', 'permissions': '0', 'position': 1})
+        category_id = next(self._ids)
+        channel_data = [{'id': str(category_id), 'type': 4, 'guild_id': str(guild_id), 'name': 'Teams',
+                         'position': 0, 'permission_overwrites': []}]
+        team_role_ids = []
+        for number in range(1, channels + 1):
+            role_id = next(self._ids)
+            team_role_ids.append(role_id)
+            roles.append({'id': str(role_id), 'name': f"Team {number}", 'permissions': '0', 'position': len(roles)})
+            channel_data.append({
+                'id': str(next(self._ids)), 'type': 0, 'guild_id': str(guild_id), 'name': f"team-{number}-group-chat",
+                'position': number, 'parent_id': str(category_id), 'nsfw': False, 'topic': None,
+                'rate_limit_per_user': 0, 'last_message_id': None,
+                'permission_overwrites': [{'id': str(role_id), 'type': 0, 'allow': str(VIEW_CHANNEL), 'deny': '0'}],
+            })
+        for role in roles:
+            role.update({'color': 0, 'hoist': False, 'managed': False, 'mentionable': True, 'flags': 0})
+
+        member_ids = [next(self._ids) for _ in range(members)]
+        closed = {user_id for user_id in member_ids if self.random.random() < closed_dm_share}
+        guild = SyntheticGuild(guild_id, f"loadtest-{members}", member_ids, closed, roles, channel_data,
+                               load_test_role_id, team_role_ids)
+        self.guilds[guild_id] = guild
+        for user_id in member_ids:
+            self.users[user_id] = guild_id
+        return guild
+
+    def _guild_create(self, guild: SyntheticGuild) -> dict:
+        member_count = len(guild.member_ids) + 2
+        return {
+            'id': str(guild.id), 'name': guild.name, 'icon': None, 'owner_id': str(self.admin_id),
+            'roles': guild.roles, 'channels': guild.channels, 'threads': [], 'emojis': [], 'stickers': [],
+            'features': [], 'voice_states': [], 'presences': [], 'stage_instances': [],
+            'guild_scheduled_events': [], 'soundboard_sounds': [],
+            # Only the bot itself is sent up front; the rest arrive through member chunking
+            'members': [self._member(guild, self.application_id)],
+            'member_count': member_count, 'large': member_count > 250, 'unavailable': False,
+            'joined_at': _timestamp(), 'verification_level': 0, 'default_message_notifications': 0,
+            'explicit_content_filter': 0, 'mfa_level': 0, 'premium_tier': 0, 'preferred_locale': 'en-US',
+            'system_channel_flags': 0, 'nsfw_level': 0, 'afk_timeout': 300,
+        }
+
+    def _message(self, channel_id: int, content: str, author: Optional[dict] = None, flags: int = 0) -> dict:
+        return {'id': str(next(self._ids)), 'channel_id': str(channel_id), 'author': author or self.bot_user,
+                'content': content, 'timestamp': _timestamp(), 'edited_timestamp': None, 'tts': False,
+                'mention_everyone': False, 'mentions': [], 'mention_roles': [], 'attachments': [],
+                'embeds': [], 'pinned': False, 'type': 0, 'flags': flags, 'components': []}
+
+    # --- Server lifecycle ---
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        app = web.Application(middlewares=[self._middleware], client_max_size=16 * 2**20)
+        api = f"/api/v{API_VERSION}"
+        app.router.add_get('/gateway', self._gateway)
+        app.router.add_get(f"{api}/users/@me", lambda request: _json_response(self.bot_user))
+        app.router.add_get(f"{api}/oauth2/applications/@me", self._application)
+        app.router.add_get(f"{api}/gateway/bot", self._gateway_bot)
+        app.router.add_put(f"{api}/applications/{{app_id}}/commands", self._bulk_commands)
+        app.router.add_put(f"{api}/applications/{{app_id}}/guilds/{{guild_id}}/commands", self._bulk_commands)
+        app.router.add_post(f"{api}/interactions/{{interaction_id}}/{{token}}/callback", self._interaction_callback)
+        app.router.add_post(f"{api}/webhooks/{{app_id}}/{{token}}", self._followup)
+        app.router.add_route('*', f"{api}/webhooks/{{app_id}}/{{token}}/messages/{{message_id}}", self._webhook_message)
+        app.router.add_post(f"{api}/users/@me/channels", self._create_dm)
+        app.router.add_post(f"{api}/channels/{{channel_id}}/messages", self._create_message)
+        app.router.add_get(f"{api}/guilds/{{guild_id}}/members", self._list_members)
+        app.router.add_get(f"{api}/guilds/{{guild_id}}/members/{{user_id}}", self._get_member)
+        app.router.add_get(f"{api}/users/{{user_id}}", self._get_user)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}"
+        logger.info(f"Fake Discord listening on {self.base_url}")
+        return self.base_url
+
+    async def stop(self):
+        for ws in list(self._sockets):
+            await ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def install(self):
+        """Point discord.py's REST routes and default gateway at this server."""
+        import discord.gateway
+        import discord.http
+        discord.http.Route.BASE = f"{self.base_url}/api/v{API_VERSION}"
+        discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(f"{self.base_url.replace('http', 'ws', 1)}/gateway")
+
+    # --- Rate limits and recording ---
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        if request.path == '/gateway':
+            return await handler(request)
+        started = time.perf_counter()
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        response = self._check_rate_limits(request, route, started)
+        if response is None:
+            try:
+                response = await handler(request)
+            except web.HTTPException as e:
+                response = e
+        self.requests.append(RequestRecord(request.method, route, response.status, started,
+                                           time.perf_counter() - started))
+        return response
+
+    def _check_rate_limits(self, request, route: str, now: float) -> Optional[web.Response]:
+        if '/interactions/' in route or '/webhooks/' in route:
+            return None  # Interaction endpoints aren't bound by the global limit
+        allowed, _, reset_after = self.global_limiter.hit('global', now)
+        if not allowed:
+            self.rate_limited['global'] += 1
+            return self._too_many_requests(reset_after, is_global=True)
+        if request.method == 'POST' and route.endswith('/channels/{channel_id}/messages'):
+            key = request.match_info['channel_id']
+            allowed, remaining, reset_after = self.channel_limiter.hit(key, now)
+            if not allowed:
+                self.rate_limited['route'] += 1
+                return self._too_many_requests(reset_after, is_global=False)
+            request['ratelimit_headers'] = {
+                'X-RateLimit-Limit': str(self.channel_limiter.limit), 'X-RateLimit-Remaining': str(remaining),
+                'X-RateLimit-Reset-After': f"{reset_after:.3f}",
+                'X-RateLimit-Reset': f"{time.time() + reset_after:.3f}",
+                'X-RateLimit-Bucket': 'channel-messages',
+            }
+        return None
+
+    def _too_many_requests(self, retry_after: float, is_global: bool) -> web.Response:
+        headers = {'Retry-After': f"{retry_after:.3f}", 'X-RateLimit-Scope': 'global' if is_global else 'user'}
+        if is_global:
+            headers['X-RateLimit-Global'] = 'true'
+        else:
+            headers.update({'X-RateLimit-Limit': str(self.channel_limiter.limit), 'X-RateLimit-Remaining': '0',
+                            'X-RateLimit-Reset-After': f"{retry_after:.3f}", 'X-RateLimit-Bucket': 'channel-messages'})
+        return _json_response({'message': 'You are being rate limited.', 'retry_after': retry_after,
+                                  'global': is_global}, status=429, headers=headers)
+
+    def _json(self, request, data, status=200) -> web.Response:
+        return _json_response(data, status=status, headers=request.get('ratelimit_headers'))
+
+    # --- Gateway ---
+
+    async def _gateway(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        self._sockets.append(ws)
+        await ws.send_json({'op': HELLO, 'd': {'heartbeat_interval': HEARTBEAT_INTERVAL_MS}})
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                payload = json.loads(msg.data)
+                op = payload.get('op')
+                if op == HEARTBEAT:
+                    await ws.send_json({'op': HEARTBEAT_ACK})
+                elif op in (IDENTIFY, RESUME):
+                    await self._send_ready(ws)
+                elif op == REQUEST_MEMBERS:
+                    await self._send_member_chunks(ws, payload['d'])
+        finally:
+            self._sockets.remove(ws)
+        return ws
+
+    async def _dispatch(self, ws, event: str, data: dict):
+        await ws.send_json({'op': DISPATCH, 't': event, 's': next(self._sequence), 'd': data})
+
+    async def _send_ready(self, ws):
+        await self._dispatch(ws, 'READY', {
+            'v': API_VERSION, 'user': self.bot_user, 'session_id': 'loadtest', 'shard': [0, 1],
+            'resume_gateway_url': f"{self.base_url.replace('http', 'ws', 1)}/gateway",
+            'guilds': [{'id': str(guild_id), 'unavailable': True} for guild_id in self.guilds],
+            'application': {'id': str(self.application_id), 'flags': 0},
+        })
+        for guild in self.guilds.values():
+            await self._dispatch(ws, 'GUILD_CREATE', self._guild_create(guild))
+
+    async def _send_member_chunks(self, ws, data: dict):
+        guild = self.guilds[int(data['guild_id'])]
+        if data.get('user_ids'):
+            wanted = {int(user_id) for user_id in data['user_ids']}
+            user_ids = [user_id for user_id in guild.member_ids if user_id in wanted]
+        else:
+            user_ids = [self.admin_id] + guild.member_ids
+        chunks = [user_ids[i:i + CHUNK_SIZE] for i in range(0, len(user_ids), CHUNK_SIZE)] or [[]]
+        for index, chunk in enumerate(chunks):
+            await self._dispatch(ws, 'GUILD_MEMBERS_CHUNK', {
+                'guild_id': str(guild.id), 'members': [self._member(guild, user_id) for user_id in chunk],
+                'chunk_index': index, 'chunk_count': len(chunks), 'nonce': data.get('nonce'),
+            })
+
+    async def send_command(self, guild: SyntheticGuild, name: str, options: dict) -> PendingInteraction:
+        """Dispatch an INTERACTION_CREATE for slash command `name`, invoked by an administrator."""
+        interaction = PendingInteraction(next(self._ids), f"token-{next(self._ids)}", time.perf_counter())
+        self.interactions[interaction.id] = interaction
+        channel_id = guild.channels[-1]['id']
+        member = self._member(guild, self.admin_id)
+        member['permissions'] = str(ADMINISTRATOR)
+        data = {
+            'id': str(interaction.id), 'application_id': str(self.application_id), 'type': 2,
+            'token': interaction.token, 'version': 1, 'guild_id': str(guild.id), 'channel_id': channel_id,
+            'channel': {'id': channel_id, 'type': 0, 'guild_id': str(guild.id)},
+            'member': member, 'locale': 'en-US', 'guild_locale': 'en-US', 'app_permissions': str(ADMINISTRATOR),
+            'entitlements': [], 'attachment_size_limit': 10 * 1024 * 1024, 'authorizing_integration_owners': {'0': str(guild.id)}, 'context': 0,
+            'data': {'id': str(next(self._ids)), 'name': name, 'type': 1,  # Global command: no guild_id
+                     'options': [{'name': key, 'type': 5 if isinstance(value, bool) else 3, 'value': value}
+                                 for key, value in options.items()]},
+        }
+        for ws in self._sockets:
+            await self._dispatch(ws, 'INTERACTION_CREATE', data)
+        return interaction
+
+    async def wait_for_message(self, interaction: PendingInteraction, prefix: str, timeout: float) -> str:
+        """Wait until the interaction gets a response or followup starting with `prefix`."""
+        async def wait():
+            while True:
+                for content in interaction.messages:
+                    if content.startswith(prefix):
+                        return content
+                interaction.message_event.clear()
+                await interaction.message_event.wait()
+        return await asyncio.wait_for(wait(), timeout)
+
+    # --- REST handlers ---
+
+    async def _application(self, request):
+        return _json_response({'id': str(self.application_id), 'name': 'loadtest', 'icon': None,
+                                  'description': '', 'bot_public': True, 'bot_require_code_grant': False,
+                                  'owner': self._user(self.admin_id, 'owner'), 'verify_key': '', 'flags': 0,
+                                  'team': None, 'summary': '', 'rpc_origins': []})
+
+    async def _gateway_bot(self, request):
+        return _json_response({'url': f"{self.base_url.replace('http', 'ws', 1)}/gateway", 'shards': 1,
+                                  'session_start_limit': {'total': 1000, 'remaining': 1000,
+                                                          'reset_after': 0, 'max_concurrency': 1}})
+
+    async def _bulk_commands(self, request):
+        commands = await request.json()
+        for command in commands:
+            command.setdefault('id', str(next(self._ids)))
+            command.setdefault('application_id', str(self.application_id))
+            command.setdefault('version', '1')
+        return _json_response(commands)
+
+    def _record_interaction_message(self, token: str, content: str):
+        for interaction in self.interactions.values():
+            if interaction.token == token:
+                interaction.messages.append(content or '')
+                interaction.message_event.set()
+                return
+
+    async def _interaction_callback(self, request):
+        interaction = self.interactions.get(int(request.match_info['interaction_id']))
+        payload = await request.json()
+        if interaction is not None and interaction.acked_at is None:
+            interaction.acked_at = time.perf_counter()
+        data = payload.get('data') or {}
+        ephemeral = bool(data.get('flags', 0) & 64)
+        response = {'interaction': {'id': request.match_info['interaction_id'], 'type': 2,
+                                    'response_message_loading': payload['type'] == 5,
+                                    'response_message_ephemeral': ephemeral}}
+        if payload['type'] == 4:
+            message = self._message(0, data.get('content'), flags=data.get('flags', 0))
+            response['interaction']['response_message_id'] = message['id']
+            response['resource'] = {'type': 4, 'message': message}
+            self._record_interaction_message(request.match_info['token'], data.get('content'))
+        return _json_response(response)
+
+    async def _followup(self, request):
+        data = await request.json()
+        self._record_interaction_message(request.match_info['token'], data.get('content'))
+        return _json_response(self._message(0, data.get('content'), flags=data.get('flags', 0)))
+
+    async def _webhook_message(self, request):
+        data = await request.json() if request.can_read_body else {}
+        return _json_response(self._message(0, data.get('content', '')))
+
+    async def _create_dm(self, request):
+        data = await request.json()
+        user_id = int(data['recipient_id'])
+        channel_id = user_id + 1  # Deterministic, and never collides with the sequential ids
+        self.dm_channels[channel_id] = user_id
+        return _json_response({'id': str(channel_id), 'type': 1, 'last_message_id': None,
+                                  'recipients': [self._user(user_id, f"user{user_id}")]})
+
+    async def _create_message(self, request):
+        channel_id = int(request.match_info['channel_id'])
+        data = await request.json()
+        user_id = self.dm_channels.get(channel_id)
+        if user_id is not None:
+            guild = self.guilds.get(self.users.get(user_id))
+            if guild is not None and user_id in guild.closed_dm_ids:
+                return self._json(request, {'message': 'Cannot send messages to this user', 'code': 50007}, 403)
+            self.delivered.append((time.perf_counter(), 'dm', user_id))
+        else:
+            self.delivered.append((time.perf_counter(), 'channel', channel_id))
+        return self._json(request, self._message(channel_id, data.get('content')))
+
+    async def _list_members(self, request):
+        guild = self.guilds.get(int(request.match_info['guild_id']))
+        if guild is None:
+            return _json_response({'message': 'Unknown Guild', 'code': 10004}, status=404)
+        limit = min(int(request.query.get('limit', 1)), 1000)
+        after = int(request.query.get('after', 0))
+        members = [user_id for user_id in guild.member_ids if user_id > after][:limit]
+        return _json_response([self._member(guild, user_id) for user_id in members])
+
+    async def _get_member(self, request):
+        guild = self.guilds.get(int(request.match_info['guild_id']))
+        user_id = int(request.match_info['user_id'])
+        if guild is None or self.users.get(user_id) != guild.id:
+            return _json_response({'message': 'Unknown Member', 'code': 10007}, status=404)
+        return _json_response(self._member(guild, user_id))
+
+    async def _get_user(self, request):
+        user_id = int(request.match_info['user_id'])
+        if user_id not in self.users:
+            return _json_response({'message': 'Unknown User', 'code': 10013}, status=404)
+        return _json_response(self._user(user_id, f"user{user_id}"))
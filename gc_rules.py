@@ -0,0 +1,140 @@
+"""Per-guild rules for finding group chat channels and their team roles.
+
+By default a group chat is a text channel whose name contains "-group-chat", its number
+is the first "-<digits>-" in the name, and its team roles are the roles in its permission
+overwrites whose name matches "team.*<number>". Guilds laid out differently set their
+own rules with /grouprules; they are kept in a small JSON file (one entry per guild).
+
+Rules are compiled once into a GCMatcher, shared by every guild with the same rules and
+replaced when a guild's rules change.
+"""
+import dataclasses
+import functools
+import json
+import logging
+import os
+import re
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+NUMBER_PLACEHOLDER = '{n}'
+
+
+@dataclasses.dataclass(frozen=True)
+class GCRules:
+    channel: str = '-group-chat'  # Substring of group chat names (or a regex, with channel_regex)
+    channel_regex: bool = False
+    category: Optional[str] = None  # Only channels in categories whose name contains this
+    number: str = r'-(\d+)-'  # Regex whose first group is the channel's number
+    role_template: str = r'team.*{n}'  # Regex for team role names, {n} = the channel's number
+
+    def describe(self) -> str:
+        channel = f"names matching /{self.channel}/" if self.channel_regex else f"names containing '{self.channel}'"
+        category = f" in categories containing '{self.category}'" if self.category else ""
+        return f"channels with {channel}{category}, number /{self.number}/, team roles /{self.role_template}/"
+
+
+DEFAULT_RULES = GCRules()
+
+
+class GCMatcher:
+    """Compiled GCRules. Raises ValueError if a pattern is invalid."""
+
+    def __init__(self, rules: GCRules):
+        self.rules = rules
+        try:
+            self._channel_pattern = re.compile(rules.channel, re.IGNORECASE) if rules.channel_regex else None
+            self._number_pattern = re.compile(rules.number)
+            # Validate the template with a sample number
+            re.compile(rules.role_template.replace(NUMBER_PLACEHOLDER, '1'), re.IGNORECASE)
+        except re.error as e:
+            raise ValueError(f"Invalid pattern: {e}") from None
+        if self._number_pattern.groups < 1:
+            raise ValueError("The number pattern needs a group, e.g. -(\\d+)-")
+        self._channel_substring = rules.channel.lower()
+        self._category = rules.category.lower() if rules.category else None
+        self._role_patterns: dict[str, re.Pattern] = {}  # Channel number -> compiled role pattern
+
+    def is_group_chat(self, channel) -> bool:
+        """Name (and category) check only; the caller checks the channel type."""
+        if self._category is not None and (channel.category is None or self._category not in channel.category.name.lower()):
+            return False
+        if self._channel_pattern is not None:
+            return self._channel_pattern.search(channel.name) is not None
+        return self._channel_substring in channel.name.lower()
+
+    def channel_number(self, channel) -> Optional[str]:
+        match = self._number_pattern.search(channel.name)
+        return match.group(1) if match else None
+
+    def role_pattern(self, number: str) -> re.Pattern:
+        """Pattern matching the team role names of channel `number` (compiled once per number)."""
+        pattern = self._role_patterns.get(number)
+        if pattern is None:
+            pattern = re.compile(self.rules.role_template.replace(NUMBER_PLACEHOLDER, re.escape(number)), re.IGNORECASE)
+            self._role_patterns[number] = pattern
+        return pattern
+
+
+@functools.lru_cache(maxsize=256)
+def compile_rules(rules: GCRules) -> GCMatcher:
+    """The matcher for `rules`; guilds with identical rules share one."""
+    return GCMatcher(rules)
+
+
+DEFAULT_MATCHER = compile_rules(DEFAULT_RULES)
+
+
+class GCRuleBook:
+    """Per-guild rules persisted in a JSON file, with the compiled matcher cached per guild."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._rules: dict[int, GCRules] = {}
+        self._matchers: dict[int, GCMatcher] = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable group chat rules {self.path}: {e}")
+            return
+        for guild_id, fields in data.items():
+            try:
+                rules = GCRules(**fields)
+                compile_rules(rules)
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Ignoring invalid group chat rules for guild {guild_id}: {e}")
+                continue
+            self._rules[int(guild_id)] = rules
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({str(guild_id): dataclasses.asdict(rules) for guild_id, rules in self._rules.items()},
+                      f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def get(self, guild_id: int) -> GCRules:
+        return self._rules.get(guild_id, DEFAULT_RULES)
+
+    def matcher(self, guild_id: int) -> GCMatcher:
+        matcher = self._matchers.get(guild_id)
+        if matcher is None:
+            matcher = self._matchers[guild_id] = compile_rules(self.get(guild_id))
+        return matcher
+
+    def set(self, guild_id: int, rules: GCRules):
+        """Store a guild's rules (DEFAULT_RULES removes the entry). Raises ValueError if they don't compile."""
+        compile_rules(rules)
+        if rules == DEFAULT_RULES:
+            self._rules.pop(guild_id, None)
+        else:
+            self._rules[guild_id] = rules
+        self._matchers.pop(guild_id, None)
+        self._save()
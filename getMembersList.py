@@ -1,39 +1,151 @@
+"""Export guild members, optionally filtered by roles, without running the bot.
+
+Examples:
+    python getMembersList.py --guild "Brawlerz - Community" --list-roles
+    python getMembersList.py --guild 1234 --role "Team 1" --role "Team 2" --format csv -o members.csv
+    python getMembersList.py --guild 1234 --role Players --exclude-role Staff --format jsonl
+
+Members are streamed over REST in pages of 1000 and written as each page arrives, so
+nothing waits for (or keeps) the whole member list. Only a bot token is needed; no
+gateway connection is opened, so it runs fine headless or from cron.
+"""
+import argparse
+import asyncio
+import csv
+import json
 import os
+import sys
 
 import discord
+from dotenv import load_dotenv
+
+from member_cache import role_filter
+
+FORMATS = ('plain', 'jsonl', 'csv')
+CSV_FIELDS = ['id', 'name', 'display_name', 'discriminator', 'bot', 'joined_at', 'roles']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--guild', required=True, help="Guild name or ID")
+    parser.add_argument('--role', action='append', default=[], help="Role name or ID to include (repeatable)")
+    parser.add_argument('--exclude-role', action='append', default=[], help="Role name or ID to exclude (repeatable)")
+    parser.add_argument('--match', choices=('any', 'all'), default='any',
+                        help="Include members with any (default) or all of the --role roles")
+    parser.add_argument('--format', choices=FORMATS, default='plain', help="Output format (default: plain)")
+    parser.add_argument('-o', '--output', help="Output file (default: stdout)")
+    parser.add_argument('--list-roles', action='store_true', help="Print the guild's roles and exit")
+    return parser.parse_args(argv)
+
+
+async def find_guild(client, name_or_id):
+    if name_or_id.isdigit():
+        return await client.fetch_guild(int(name_or_id))
+    async for guild in client.fetch_guilds(limit=None):
+        if guild.name == name_or_id:
+            return await client.fetch_guild(guild.id)  # fetch_guilds results carry no roles
+    return None
+
+
+def resolve_roles(guild, names_or_ids):
+    roles, missing = set(), []
+    for value in names_or_ids:
+        role = guild.get_role(int(value)) if value.isdigit() else discord.utils.get(guild.roles, name=value)
+        if role is None:
+            missing.append(value)
+        else:
+            roles.add(role.id)
+    return roles, missing
+
+
+class RowWriter:
+    def __init__(self, fmt, stream):
+        self.fmt = fmt
+        self.stream = stream
+        self._csv = None
+        if fmt == 'csv':
+            self._csv = csv.DictWriter(stream, fieldnames=CSV_FIELDS)
+            self._csv.writeheader()
+
+    def write(self, member, role_names):
+        if self.fmt == 'plain':
+            name = member.name if member.discriminator == '0' else f"{member.name}#{member.discriminator}"
+            self.stream.write(name + '\n')
+            return
+        row = {
+            'id': member.id,
+            'name': member.name,
+            'display_name': member.display_name,
+            'discriminator': member.discriminator,
+            'bot': member.bot,
+            'joined_at': member.joined_at.isoformat() if member.joined_at else None,
+            'roles': role_names,
+        }
+        if self.fmt == 'jsonl':
+            self.stream.write(json.dumps(row) + '\n')
+        else:
+            row['roles'] = ';'.join(role_names)
+            self._csv.writerow(row)
+
 
-intents = discord.Intents.default()
-intents.members = True  # This is necessary to access the list of members
-print(os.getenv('DISCORD_TOKEN'))
-client = discord.Client(intents=intents)
+async def export(args, token, out):
+    # Members are streamed, never cached
+    intents = discord.Intents.default()
+    intents.members = True
+    client = discord.Client(intents=intents, member_cache_flags=discord.MemberCacheFlags.none())
+    async with client:
+        await client.login(token)
+        guild = await find_guild(client, args.guild)
+        if guild is None:
+            print(f"Server '{args.guild}' not found!", file=sys.stderr)
+            return 1
 
-@client.event
-async def on_ready():
-    print(f'Logged in as {client.user}!')
+        if args.list_roles:
+            for role in guild.roles:
+                out.write(f"{role.id}\t{role.name}\n")
+            return 0
 
-    guild = discord.utils.get(client.guilds, name="Brawlerz - Community")
-    if guild is None:
-        print("Server not found!")
-        return
+        include, missing = resolve_roles(guild, args.role)
+        exclude, missing_excluded = resolve_roles(guild, args.exclude_role)
+        if missing or missing_excluded:
+            print(f"No role(s) named {', '.join(missing + missing_excluded)} found in this server.", file=sys.stderr)
+            return 1
+        matches = role_filter(include, exclude, require_all=args.match == 'all', everyone_id=guild.id)
+        role_names = {role.id: role.name for role in guild.roles}
 
-    print("Available Roles:")
-    for role in guild.roles:
-        print(role.name)
+        writer = RowWriter(args.format, out)
+        count = 0
+        page_size = 1000  # fetch_members requests pages of 1000
+        async for member in guild.fetch_members(limit=None):
+            if not matches(member):
+                continue
+            writer.write(member, [role_names[r] for r in member._roles if r in role_names])
+            count += 1
+            if count % page_size == 0:
+                out.flush()
+        out.flush()
+        print(f"Exported {count} member(s) from {guild.name}.", file=sys.stderr)
+        return 0
 
-    # Ask for the role name to list members
-    role_name = input("Enter the role name to print its members: ")
-    role = discord.utils.get(guild.roles, name=role_name)
 
-    if role is None:
-        print(f"No role named '{role_name}' found in this server.")
-        return
+def main(argv=None):
+    load_dotenv()
+    args = parse_args(argv)
+    token = os.getenv('DISCORD_TOKEN')
+    if not token:
+        print("Error: DISCORD_TOKEN not found in environment variables/.env file.", file=sys.stderr)
+        return 1
 
-    print(f"Members with the role '{role_name}':")
-    for member in guild.members:
-        if role in member.roles:
-            print(f"{member.name}#{member.discriminator}")
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        return asyncio.run(export(args, token, out))
+    except discord.LoginFailure:
+        print("Error: Invalid Discord Token. Please check your .env file.", file=sys.stderr)
+        return 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
 
-    # Close the client after the task is done
-    await client.close()
 
-client.run(str(os.getenv('DISCORD_TOKEN')))
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,288 @@
+import logging
+from typing import Callable, Optional
+
+import discord
+
+from gc_rules import DEFAULT_MATCHER, GCMatcher
+
+logger = logging.getLogger(__name__)
+
+# Group chat channels are named like "team-12-group-chat"; the number links them to "Team 12"
+# roles. Guilds can change how channels, numbers and roles are matched (see gc_rules.py).
+NO_CATEGORY_SORT_NAME = '~~~ZZZ'  # Sort no-category channels last
+
+
+def channel_number(channel, matcher: GCMatcher = DEFAULT_MATCHER) -> Optional[str]:
+    return matcher.channel_number(channel)
+
+
+def gc_sort_key(channel, matcher: GCMatcher = DEFAULT_MATCHER):
+    """Sort by category name (no-category last), then by the number in the channel name."""
+    cat_name = channel.category.name if channel.category else NO_CATEGORY_SORT_NAME
+    number = matcher.channel_number(channel)
+    return (cat_name, int(number) if number is not None and number.isdigit() else float('inf'))
+
+
+def is_group_chat(channel, matcher: GCMatcher = DEFAULT_MATCHER) -> bool:
+    return isinstance(channel, discord.TextChannel) and matcher.is_group_chat(channel)
+
+
+def overwrite_roles(channel) -> list[discord.Role]:
+    """Roles with a permission overwrite on the channel.
+
+    Reads the raw overwrite ids instead of `channel.overwrites`, which builds a
+    PermissionOverwrite object for every entry and dominates the cost of a scan.
+    """
+    guild = channel.guild
+    roles = []
+    for overwrite in channel._overwrites:
+        if overwrite.is_role():
+            role = guild.get_role(overwrite.id)
+            if role is not None:
+                roles.append(role)
+    return roles
+
+
+def match_team_roles(channel, roles=None, matcher: GCMatcher = DEFAULT_MATCHER) -> Optional[list[discord.Role]]:
+    """Roles in the channel's overwrites that match its number, or None if the name has no number.
+
+    `roles` can be passed when the caller already resolved the channel's overwrite roles.
+    """
+    number = matcher.channel_number(channel)
+    if number is None:
+        return None
+    pattern = matcher.role_pattern(number)
+    if roles is None:
+        roles = overwrite_roles(channel)
+    return [role for role in roles if pattern.search(role.name)]
+
+
+def scan_GCs(guild, matcher: GCMatcher = DEFAULT_MATCHER) -> list[dict]:
+    """Full scan of the guild's channels: [{'channel': channel, 'role': [roles]}], sorted."""
+    result = []
+    if not guild or not guild.channels:
+        return result
+    channels = (c for c in guild.channels if is_group_chat(c, matcher))
+    for channel in sorted(channels, key=lambda c: gc_sort_key(c, matcher)):
+        roles = match_team_roles(channel, matcher=matcher)
+        if roles is None:
+            logger.warning(f"Could not extract number from channel name: {channel.name}")
+            continue
+        result.append({"channel": channel, "role": roles})
+    return result
+
+
+class _GuildGCs:
+    __slots__ = ('matcher', 'roles_by_channel', 'overwrites_by_channel', 'channels_by_role', 'ordered')
+
+    def __init__(self, matcher: GCMatcher):
+        self.matcher = matcher  # Rules the entry was built with
+        self.roles_by_channel: dict[int, list[int]] = {}  # group chat id -> matching team role ids
+        self.overwrites_by_channel: dict[int, set[int]] = {}  # group chat id -> role ids in its overwrites
+        self.channels_by_role: dict[int, set[int]] = {}  # role id -> group chats whose overwrites mention it
+        self.ordered: Optional[list[int]] = None  # sorted group chat ids, rebuilt lazily after changes
+
+
+class GroupChatIndex:
+    """Per-guild index of group chat channel -> matching team roles.
+
+    Built once per guild and kept current from channel/role gateway events, so lookups
+    only touch the channels in the result instead of regex-scanning every channel.
+    `matcher_for(guild_id)` gives a guild's compiled rules; a guild is rebuilt on its
+    next lookup once that returns a different matcher (its rules changed).
+    """
+
+    def __init__(self, matcher_for: Callable[[int], GCMatcher] = lambda guild_id: DEFAULT_MATCHER):
+        self.matcher_for = matcher_for
+        self._guilds: dict[int, _GuildGCs] = {}
+
+    def build(self, guild):
+        entry = _GuildGCs(self.matcher_for(guild.id))
+        self._guilds[guild.id] = entry
+        for channel in guild.channels:
+            self._index_channel(entry, channel)
+        logger.info(f"Indexed {len(entry.roles_by_channel)} group chat(s) in guild {guild.id}.")
+
+    def _entry(self, guild) -> _GuildGCs:
+        entry = self._guilds.get(guild.id)
+        if entry is None or entry.matcher is not self.matcher_for(guild.id):
+            self.build(guild)
+            entry = self._guilds[guild.id]
+        return entry
+
+    def team_roles(self, guild) -> dict[int, list[int]]:
+        """Group chat id -> ids of its matching team roles (a read-only view of the index)."""
+        return self._entry(guild).roles_by_channel
+
+    def get_GCs(self, guild) -> list[dict]:
+        """Same shape as scan_GCs, served from the index."""
+        entry = self._entry(guild)
+        if entry.ordered is None:
+            channels = [guild.get_channel(cid) for cid in entry.roles_by_channel]
+            entry.ordered = [c.id for c in sorted((c for c in channels if c is not None),
+                                                  key=lambda c: gc_sort_key(c, entry.matcher))]
+
+        result = []
+        for channel_id in entry.ordered:
+            channel = guild.get_channel(channel_id)
+            if channel is None:
+                continue
+            roles = [role for role in map(guild.get_role, entry.roles_by_channel[channel_id]) if role is not None]
+            result.append({"channel": channel, "role": roles})
+        return result
+
+    def _unindex_channel(self, entry: _GuildGCs, channel_id: int):
+        if entry.roles_by_channel.pop(channel_id, None) is None:
+            return
+        for role_id in entry.overwrites_by_channel.pop(channel_id, ()):
+            channels = entry.channels_by_role[role_id]
+            channels.discard(channel_id)
+            if not channels:
+                del entry.channels_by_role[role_id]
+        entry.ordered = None
+
+    def _index_channel(self, entry: _GuildGCs, channel):
+        if not is_group_chat(channel, entry.matcher):
+            return
+        if entry.matcher.channel_number(channel) is None:
+            logger.warning(f"Could not extract number from channel name: {channel.name}")
+            return
+        roles = overwrite_roles(channel)
+        entry.roles_by_channel[channel.id] = [role.id for role in match_team_roles(channel, roles, entry.matcher)]
+        entry.overwrites_by_channel[channel.id] = {role.id for role in roles}
+        for role_id in entry.overwrites_by_channel[channel.id]:
+            entry.channels_by_role.setdefault(role_id, set()).add(channel.id)
+        entry.ordered = None
+
+    # --- Event hooks ---
+
+    def channel_changed(self, channel):
+        """Channel created or updated (name, category or overwrites)."""
+        entry = self._guilds.get(channel.guild.id)
+        if entry is None:
+            return  # Built lazily on first lookup
+        if isinstance(channel, discord.CategoryChannel):
+            self._category_changed(entry, channel)
+            return
+        self._unindex_channel(entry, channel.id)
+        self._index_channel(entry, channel)
+
+    def channel_deleted(self, channel):
+        entry = self._guilds.get(channel.guild.id)
+        if entry is None:
+            return
+        if isinstance(channel, discord.CategoryChannel):
+            self._category_changed(entry, channel)
+            return
+        self._unindex_channel(entry, channel.id)
+
+    def _category_changed(self, entry: _GuildGCs, category):
+        """Category renamed or deleted: its name feeds the sort order and, with a category rule, matching."""
+        entry.ordered = None
+        if entry.matcher.rules.category is None:
+            return
+        for channel in category.guild.channels:
+            if getattr(channel, 'category_id', None) == category.id:
+                self._unindex_channel(entry, channel.id)
+                self._index_channel(entry, channel)
+
+    def role_changed(self, role):
+        """Role renamed or deleted: re-match only the group chats whose overwrites mention it."""
+        entry = self._guilds.get(role.guild.id)
+        if entry is None:
+            return
+        for channel_id in list(entry.channels_by_role.get(role.id, ())):
+            channel = role.guild.get_channel(channel_id)
+            self._unindex_channel(entry, channel_id)
+            if channel is not None:
+                self._index_channel(entry, channel)
+
+    def forget_guild(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+
+class RoleMemberIndex:
+    """Per-guild inverted index of role id -> member ids.
+
+    `role.members` scans the whole member cache on every call; this index is built once
+    per guild and kept current from member join/update/remove events, so audience queries
+    are set operations over the roles involved.
+    """
+
+    def __init__(self):
+        self._guilds: dict[int, dict[int, set[int]]] = {}
+
+    def build(self, guild):
+        roles: dict[int, set[int]] = {}
+        for member in guild.members:
+            for role_id in member._roles:  # Excludes @everyone
+                roles.setdefault(role_id, set()).add(member.id)
+        self._guilds[guild.id] = roles
+        logger.info(f"Indexed {len(roles)} role(s) over {len(guild.members)} member(s) in guild {guild.id}.")
+
+    def _roles(self, guild) -> dict[int, set[int]]:
+        roles = self._guilds.get(guild.id)
+        if roles is None:
+            self.build(guild)
+            roles = self._guilds[guild.id]
+        return roles
+
+    def member_ids(self, guild, role_id: int) -> set[int]:
+        if role_id == guild.id:  # @everyone
+            return {member.id for member in guild.members}
+        return self._roles(guild).get(role_id, set())
+
+    def query(self, guild, include: list[int], exclude: list[int] = (), require_all: bool = False) -> set[int]:
+        """Member ids with any (or, with require_all, every) role in `include` and none in `exclude`."""
+        if not include:
+            return set()
+        sets = sorted((self.member_ids(guild, role_id) for role_id in include), key=len)
+        if require_all:
+            result = set(sets[0]).intersection(*sets[1:])
+        else:
+            result = set().union(*sets)
+        for role_id in exclude:
+            if not result:
+                break
+            result.difference_update(self.member_ids(guild, role_id))
+        return result
+
+    # --- Event hooks ---
+
+    def member_joined(self, member):
+        roles = self._guilds.get(member.guild.id)
+        if roles is None:
+            return  # Built lazily on first query
+        for role_id in member._roles:
+            roles.setdefault(role_id, set()).add(member.id)
+
+    def member_updated(self, before, after):
+        roles = self._guilds.get(after.guild.id)
+        if roles is None:
+            return
+        old, new = set(before._roles), set(after._roles)
+        if old == new:
+            return
+        for role_id in old - new:
+            members = roles.get(role_id)
+            if members is not None:
+                members.discard(after.id)
+        for role_id in new - old:
+            roles.setdefault(role_id, set()).add(after.id)
+
+    def member_removed(self, member):
+        roles = self._guilds.get(member.guild.id)
+        if roles is None:
+            return
+        for role_id in member._roles:
+            members = roles.get(role_id)
+            if members is not None:
+                members.discard(member.id)
+
+    def role_deleted(self, role):
+        roles = self._guilds.get(role.guild.id)
+        if roles is not None:
+            roles.pop(role.id, None)
+
+    def forget_guild(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
@@ -0,0 +1,168 @@
+"""Load test: drive the bot's fan-out commands end to end against a local fake Discord.
+
+Examples:
+    python loadtest.py                                        # /senddmbyrole to 1k and 10k members
+    python loadtest.py --recipients 1000,10000,50000 --closed-dms 0.05 -o loadtest.json
+    python loadtest.py --scenario reminder --channels 200
+
+main.py runs unmodified in this process, connected to fake_discord.py instead of Discord:
+it logs in, receives synthetic guilds over the gateway, gets slash commands as
+INTERACTION_CREATE events and sends through the fake REST API, which enforces per-route
+and global rate limits. Reported per run: throughput, interaction ack time, delivery
+latency percentiles (from the command to each message arriving) and retry overhead
+(429s per delivered message).
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+
+DEFAULT_RECIPIENTS = '1000,10000'
+
+
+def parse_sizes(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenario', choices=('senddmbyrole', 'reminder'), default='senddmbyrole',
+                        help="Fan-out to drive (default: senddmbyrole)")
+    parser.add_argument('--recipients', type=parse_sizes, default=parse_sizes(DEFAULT_RECIPIENTS),
+                        help=f"Members per synthetic guild, one run each (default: {DEFAULT_RECIPIENTS})")
+    parser.add_argument('--channels', type=int, default=100,
+                        help="Group chat channels per guild, the reminder scenario's recipients (default: 100)")
+    parser.add_argument('--closed-dms', type=float, default=0.0, help="Share of members with DMs closed (default: 0)")
+    parser.add_argument('--global-rate', type=int, default=50, help="Fake global rate limit per second (default: 50)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Added seconds per fake API request (default: 0)")
+    parser.add_argument('--dm-rate', type=float, default=45.0,
+                        help="DM_RATE_PER_SECOND for the bot under test (default: 45)")
+    parser.add_argument('--dm-concurrency', type=int, default=8, help="DM_CONCURRENCY for the bot (default: 8)")
+    parser.add_argument('--timeout', type=float, default=3600.0, help="Seconds to wait for each run (default: 3600)")
+    parser.add_argument('--verbose', action='store_true', help="Show the bot's log output")
+    parser.add_argument('-o', '--output', help="Write results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summarize_run(fake, started, interaction, first_request, first_delivery, rate_limited_before, text):
+    deliveries = fake.delivered[first_delivery:]
+    delays = [at - started for at, _, _ in deliveries]
+    elapsed = (deliveries[-1][0] - started) if deliveries else 0.0
+    rate_limited = sum(fake.rate_limited.values()) - rate_limited_before
+    posts = [r for r in fake.requests[first_request:] if r.method == 'POST' and r.route.endswith('/messages')]
+    return {
+        'delivered': len(deliveries),
+        'elapsed_s': elapsed,
+        'throughput_per_s': len(deliveries) / elapsed if elapsed else None,
+        'ack_ms': (interaction.acked_at - interaction.dispatched_at) * 1000 if interaction.acked_at else None,
+        'delivery_p50_s': percentile(delays, 0.50),
+        'delivery_p95_s': percentile(delays, 0.95),
+        'delivery_p99_s': percentile(delays, 0.99),
+        'request_p99_ms': (percentile([r.duration for r in posts], 0.99) or 0) * 1000,
+        'requests': len(fake.requests) - first_request,
+        'rate_limited': rate_limited,
+        'retry_overhead': rate_limited / max(1, len(deliveries)),
+        'summary': text,
+    }
+
+
+async def run_senddmbyrole(fake, guild, args):
+    marks = len(fake.requests), len(fake.delivered), sum(fake.rate_limited.values())
+    interaction = await fake.send_command(guild, 'senddmbyrole', {
+        'message': 'Load test message', 'rolesstring': f"<@&{guild.load_test_role_id}>"})
+    text = await fake.wait_for_message(interaction, 'Finished sending DMs', args.timeout)
+    return summarize_run(fake, interaction.dispatched_at, interaction, *marks, text)
+
+
+async def run_reminder(fake, guild, args):
+    delay = 3
+    marks = len(fake.requests), len(fake.delivered), sum(fake.rate_limited.values())
+    interaction = await fake.send_command(guild, 'set_reminder', {
+        'reminder_time': f"in {delay} seconds", 'reminder_message': 'Load test reminder'})
+    text = await fake.wait_for_message(interaction, 'Reminder message sent', args.timeout + delay)
+    return summarize_run(fake, interaction.dispatched_at + delay, interaction, *marks, text)
+
+
+async def run(args):
+    from fake_discord import FakeDiscord
+    fake = FakeDiscord(global_rate=args.global_rate, latency=args.latency)
+    guilds = [fake.add_guild(size, channels=args.channels, closed_dm_share=args.closed_dms) for size in args.recipients]
+    await fake.start()
+    fake.install()
+
+    import main  # After the environment is set up; see main_cli()
+    bot_task = asyncio.create_task(main.bot.start('loadtest-token'))
+    ready_started = time.perf_counter()
+    ready_task = asyncio.create_task(main.bot.wait_until_ready())
+    await asyncio.wait((ready_task, bot_task), timeout=args.timeout, return_when=asyncio.FIRST_COMPLETED)
+    if not ready_task.done():
+        ready_task.cancel()
+        await fake.stop()
+        if bot_task.done():
+            bot_task.result()  # Raise whatever stopped the bot
+        raise TimeoutError(f"Bot was not ready after {args.timeout}s")
+    print(f"Bot ready in {time.perf_counter() - ready_started:.2f}s with {len(guilds)} guild(s).")
+
+    scenario = run_senddmbyrole if args.scenario == 'senddmbyrole' else run_reminder
+    results = {}
+    try:
+        for size, guild in zip(args.recipients, guilds):
+            run_task = asyncio.create_task(scenario(fake, guild, args))
+            await asyncio.wait((run_task, bot_task), return_when=asyncio.FIRST_COMPLETED)
+            if not run_task.done():
+                run_task.cancel()
+                bot_task.result()  # The bot stopped mid-run: raise why
+                raise RuntimeError("Bot stopped during the run")
+            result = run_task.result()
+            results[str(size)] = result
+            print(f"{args.scenario:<14} {size:>7}  {result['delivered']:>7} delivered in {result['elapsed_s']:8.2f}s"
+                  f"  ({result['throughput_per_s'] or 0:7.1f}/s)  ack {result['ack_ms'] or 0:7.1f} ms"
+                  f"  p50/p95/p99 {result['delivery_p50_s'] or 0:.2f}/{result['delivery_p95_s'] or 0:.2f}"
+                  f"/{result['delivery_p99_s'] or 0:.2f}s  429s {result['rate_limited']}"
+                  f" ({result['retry_overhead']:.1%})")
+    finally:
+        await main.bot.close()
+        await asyncio.gather(bot_task, return_exceptions=True)
+        await fake.stop()
+    return results
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix='loadtest-')
+    # Keep the bot under test away from the real databases and command sync state
+    os.environ.update({
+        'REMINDER_DB_PATH': os.path.join(workdir, 'reminders.db'),
+        'OUTBOX_DB_PATH': os.path.join(workdir, 'outbox.db'),
+        'COMMAND_SYNC_STATE': os.path.join(workdir, 'command_sync.json'),
+        'GC_RULES_PATH': os.path.join(workdir, 'gc_rules.json'),
+        'DM_RATE_PER_SECOND': str(args.dm_rate),
+        'DM_CONCURRENCY': str(args.dm_concurrency),
+        'DELIVERY_MODE': 'inline',
+        'MEMBER_CACHE': 'full',
+        'METRICS_PORT': '0',
+        'LOG_LEVEL': 'INFO' if args.verbose else 'ERROR',
+    })
+
+    started = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    results = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'meta': {'timestamp': started, 'args': vars(args)}, 'results': {args.scenario: results}}, f, indent=2)
+        print(f"\nWrote {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
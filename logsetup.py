@@ -0,0 +1,126 @@
+"""Logging that never blocks the event loop, and aggregated per-recipient outcome lines.
+
+setup_logging() puts a QueueHandler on the root logger: records are only enqueued on the
+calling thread, and a QueueListener thread formats and writes them (plain text, or one
+JSON object per line). OutcomeLog turns per-recipient delivery outcomes into one summary
+line per interval, logging individual recipients only for a sample of outcomes.
+"""
+import atexit
+import datetime
+import json
+import logging
+import queue
+import sys
+import time
+from collections import Counter
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_listener: Optional[QueueListener] = None
+
+
+class _ThreadQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener is a thread in this process, so the record needn't be pickled:
+        # skip QueueHandler's eager formatting and let the listener do it
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with any `extra=` fields as top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRS)
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(level=logging.INFO, fmt: str = 'text', stream=None) -> QueueListener:
+    """Route all logging through a queue drained by a background thread.
+
+    `fmt` is 'text' or 'json'. Replaces the root logger's handlers; calling it again
+    restarts the listener with the new settings. The listener is stopped (and the queue
+    flushed) at exit.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(_ThreadQueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def _stop():
+    global _listener
+    if _listener is not None:
+        _listener.stop()  # Writes out whatever is still queued
+        _listener = None
+
+
+class OutcomeLog:
+    """Aggregates delivery outcomes into periodic summary lines.
+
+    note() is called once per recipient. Individual recipients are only logged for the
+    first outcome of each status in an interval and then every `sample_every`-th one
+    (failures at WARNING, the rest at DEBUG); every `interval` seconds one INFO line
+    sums up the outcomes since the last. Call flush() when a fan-out ends.
+    """
+
+    def __init__(self, logger: logging.Logger, kind: str, interval: float = 10.0, sample_every: int = 100,
+                 quiet_statuses=()):
+        self.logger = logger
+        self.kind = kind
+        self.interval = interval
+        self.sample_every = max(1, sample_every)
+        self.quiet_statuses = frozenset(quiet_statuses)  # Sampled at DEBUG instead of WARNING
+        self._counts = Counter()
+        self._retries = 0
+        self._started = time.monotonic()
+
+    def note(self, status: str, recipient, error=None, attempts: int = 1):
+        self._counts[status] += 1
+        self._retries += attempts - 1
+        count = self._counts[status]
+        if count == 1 or count % self.sample_every == 0:
+            level = logging.DEBUG if status in self.quiet_statuses else logging.WARNING
+            if self.logger.isEnabledFor(level):
+                self.logger.log(level, "%s %s to %s (%d attempt(s))%s [sample: #%d with this status]",
+                                self.kind, status, recipient, attempts, f": {error}" if error else "", count,
+                                extra={'kind': self.kind, 'status': status, 'recipient': str(recipient)})
+        if time.monotonic() - self._started >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """Log the outcomes counted since the last summary, if any."""
+        if self._counts:
+            elapsed = time.monotonic() - self._started
+            counts, retries = self._counts, self._retries
+            self._counts, self._retries = Counter(), 0
+            self.logger.info("%s outcomes in the last %.1fs: %s (%d retried attempt(s))", self.kind, elapsed,
+                             ', '.join(f"{status} {n}" for status, n in sorted(counts.items())), retries,
+                             extra={'kind': self.kind, 'counts': dict(counts), 'retries': retries,
+                                    'seconds': round(elapsed, 3)})
+        self._started = time.monotonic()
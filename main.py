@@ -1,28 +1,115 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
 import logging
 import re
 import asyncio
+import dataclasses
+import itertools
 import os
+import time
 import datetime
-import dateutil.parser
-import dateutil.tz # Added for timezone handling
+from collections import Counter
+from typing import NamedTuple, Optional
+from scheduler import Reminder, ReminderScheduler
+from reminder_store import ReminderStore, FIRED, CANCELLED
+from delivery import (DeliveryEngine, DeliveryResult, TokenBucket,
+                      DISCORD_GLOBAL_RATE, SENT, FORBIDDEN, FAILED, SKIPPED, SUPPRESSED)
+from timeparse import parse_reminder_time, format_delay
+from recurrence import normalize_rule, validate_rule, next_occurrence, describe as describe_recurrence, PRESETS
+import metrics
+from metrics import COMMAND_LATENCY, GET_GCS_DURATION, MESSAGES_SENT, RATE_LIMITED, RETRY_AFTER_SECONDS, REMINDER_LATENESS
+import outbox
+from outbox import Outbox
+from indexes import GroupChatIndex, RoleMemberIndex
+from gc_rules import GCRuleBook, DEFAULT_RULES
+from member_cache import MemberLRU, fetch_role_members
+from command_sync import sync_if_changed
+from logsetup import OutcomeLog, setup_logging
 # importing necessary functions from dotenv library
 from dotenv import load_dotenv, dotenv_values
 # loading variables from .env file
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Configure logging: records are written by a background thread (see logsetup.py), as
+# plain text or, with LOG_FORMAT=json, one JSON object per line
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+setup_logging(LOG_LEVEL if isinstance(logging.getLevelName(LOG_LEVEL), int) else logging.INFO,
+              'json' if LOG_FORMAT == 'json' else 'text')
 
 logger = logging.getLogger(__name__)
+if not isinstance(logging.getLevelName(LOG_LEVEL), int):
+    logger.warning(f"Unknown LOG_LEVEL '{LOG_LEVEL}', using 'INFO'.")
+if LOG_FORMAT not in ('text', 'json'):
+    logger.warning(f"Unknown LOG_FORMAT '{LOG_FORMAT}', using 'text'.")
+
+# Per-recipient delivery outcomes are summed up every LOG_SUMMARY_SECONDS; only every
+# LOG_SAMPLE_EVERY-th recipient per outcome is logged individually
+LOG_SUMMARY_SECONDS = float(os.getenv('LOG_SUMMARY_SECONDS', '10'))
+LOG_SAMPLE_EVERY = int(os.getenv('LOG_SAMPLE_EVERY', '100'))
+dm_log = OutcomeLog(logger, 'DM', interval=LOG_SUMMARY_SECONDS, sample_every=LOG_SAMPLE_EVERY,
+                    quiet_statuses=(SENT, SKIPPED))
+channel_log = OutcomeLog(logger, 'Channel post', interval=LOG_SUMMARY_SECONDS, sample_every=LOG_SAMPLE_EVERY,
+                         quiet_statuses=(SENT,))
 
 intents = discord.Intents.default()
 intents.members = True  # Enable member intents (important for accessing member list)
 
+# Member caching. 'full': discord.py keeps every member of every guild in memory and
+# chunks guilds at startup. 'lean': no member cache; role audiences are fetched on demand
+# and recently used members kept in a bounded LRU (see member_cache.py).
+MEMBER_CACHE_MODE = os.getenv('MEMBER_CACHE', 'full')
+if MEMBER_CACHE_MODE not in ('full', 'lean'):
+    logger.warning(f"Unknown MEMBER_CACHE '{MEMBER_CACHE_MODE}', using 'full'.")
+    MEMBER_CACHE_MODE = 'full'
+LEAN_MEMBERS = MEMBER_CACHE_MODE == 'lean'
+member_lru = MemberLRU(int(os.getenv('MEMBER_LRU_SIZE', '5000')))
+
 # Create a bot instance with a specified command prefix, e.g., '!'
-bot = commands.Bot(command_prefix='/', intents=intents)
+bot = commands.Bot(
+    command_prefix='/', intents=intents,
+    member_cache_flags=discord.MemberCacheFlags.none() if LEAN_MEMBERS else discord.MemberCacheFlags.from_intents(intents),
+    chunk_guilds_at_startup=not LEAN_MEMBERS,
+)
+
+# DM fan-out goes through a bounded worker pool paced by token buckets (see delivery.py).
+# One global bucket is shared by everything that talks to the API in bulk.
+global_bucket = TokenBucket(DISCORD_GLOBAL_RATE)
+dm_engine = DeliveryEngine(
+    rate=float(os.getenv('DM_RATE_PER_SECOND', '5')),
+    concurrency=int(os.getenv('DM_CONCURRENCY', '8')),
+    global_bucket=global_bucket,
+)
+
+# Channel posts (reminder fan-outs) share the global bucket with DMs
+channel_engine = DeliveryEngine(
+    rate=float(os.getenv('CHANNEL_RATE_PER_SECOND', '20')),
+    concurrency=int(os.getenv('CHANNEL_CONCURRENCY', '10')),
+    global_bucket=global_bucket,
+)
+
+# Durable record of every fan-out, per recipient (see outbox.py)
+OUTBOX_DB_PATH = os.getenv('OUTBOX_DB_PATH', 'outbox.db')
+OUTBOX_RETENTION = datetime.timedelta(days=30)
+campaign_outbox = Outbox(OUTBOX_DB_PATH)
+# How long a recipient whose DMs were closed is skipped by later campaigns
+UNREACHABLE_TTL = datetime.timedelta(days=float(os.getenv('DM_CLOSED_TTL_DAYS', '7')))
+
+# 'inline': fan-outs are sent from this process. 'queue': they're only recorded in the
+# outbox and sent by separate worker.py processes, keeping this event loop free for the gateway.
+DELIVERY_MODE = os.getenv('DELIVERY_MODE', 'inline')
+if DELIVERY_MODE not in ('inline', 'queue'):
+    logger.warning(f"Unknown DELIVERY_MODE '{DELIVERY_MODE}', using 'inline'.")
+    DELIVERY_MODE = 'inline'
+
+# How each guild's group chats and team roles are recognised, set with /grouprules (see gc_rules.py)
+GC_RULES_PATH = os.getenv('GC_RULES_PATH', 'gc_rules.json')
+gc_rules = GCRuleBook(GC_RULES_PATH)
+# Group chat channel -> team role mapping, kept current from channel/role events below
+gc_index = GroupChatIndex(gc_rules.matcher)
+# Role -> member ids, kept current from member events below
+role_index = RoleMemberIndex()
 
 # --- Helper Functions (print_GCs_results, format_GCs_results, get_mentions_asid, get_GCs, send_message_to_channel, send_message) ---
 # Assume these functions remain the same as in your original code
@@ -35,27 +122,107 @@ def print_GCs_results(results):
         role_names = ', '.join(role.name for role in roles) if roles else 'No matching roles'
         print(f"Channel Name: {channel.category} {channel.name} - Accessible by: {role_names}")
 
+MESSAGE_LIMIT = 2000 # Discord's maximum message length
+
+def format_GC_line(item):
+    channel = item['channel']
+    roles = item['role']
+    # Prepare role names for display
+    role_names = ', '.join(role.name for role in roles) if roles else 'No matching roles'
+    # Format for Discord output
+    return f"**{channel.category if channel.category else 'No Category'} {channel.name}** - Accessible by: {role_names}"
+
+def iter_pages(lines, max_length=MESSAGE_LIMIT):
+    """Pack lines into pages of at most max_length characters in a single pass.
+
+    A running length is kept per page, so this is linear in the total output size.
+    Lines longer than a page are split across pages. Pages are yielded as they fill up.
+    """
+    current = []
+    current_length = 0
+    for line in lines:
+        while len(line) > max_length:
+            if current:
+                yield "\n".join(current)
+                current, current_length = [], 0
+            yield line[:max_length]
+            line = line[max_length:]
+        added = len(line) + (1 if current else 0) # +1 for the joining newline
+        if current and current_length + added > max_length:
+            yield "\n".join(current)
+            current, current_length, added = [], 0, len(line)
+        current.append(line)
+        current_length += added
+    if current:
+        yield "\n".join(current)
+
+def paginate_lines(lines, max_length=MESSAGE_LIMIT):
+    return list(iter_pages(lines, max_length))
+
+def format_GCs_pages(results, max_length=MESSAGE_LIMIT):
+    """All group chat lines, packed into message-sized pages."""
+    return paginate_lines(map(format_GC_line, results), max_length)
+
 def format_GCs_results(results):
-    response_lines = []
+    """First page of the group chat report, with a note if there is more (single-message contexts)."""
     max_length = 1900  # Set a maximum length to leave room for additional characters
-    for item in results:
-        channel = item['channel']
-        roles = item['role']
-        # Prepare role names for display
-        role_names = ', '.join(role.name for role in roles) if roles else 'No matching roles'
-        # Format for Discord output
-        line = f"**{channel.category if channel.category else 'No Category'} {channel.name}** - Accessible by: {role_names}"
-        if len("\n".join(response_lines)) + len(line) > max_length:
-            response_lines.append("...and more")
-            break
-        response_lines.append(line)
-    return "\n".join(response_lines)
+    pages = list(itertools.islice(iter_pages(map(format_GC_line, results), max_length), 2))
+    if not pages:
+        return ""
+    return pages[0] + ("\n...and more" if len(pages) > 1 else "")
+
+
+class PaginatorView(discord.ui.View):
+    """Previous/next buttons over a list of precomputed pages; clicks never recompute them."""
+
+    def __init__(self, pages, user_id, timeout=600):
+        super().__init__(timeout=timeout)
+        self.pages = pages
+        self.user_id = user_id
+        self.index = 0
+        self.message = None # Set by the sender, so the buttons can be disabled on timeout
+        self._refresh_buttons()
+
+    def _refresh_buttons(self):
+        self.previous_button.disabled = self.index == 0
+        self.next_button.disabled = self.index >= len(self.pages) - 1
+        self.page_button.label = f"{self.index + 1}/{len(self.pages)}"
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.user_id
+
+    async def on_timeout(self):
+        # Clicks stop being handled now; don't leave the buttons looking usable
+        for item in self.children:
+            item.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException as e:
+                logger.info(f"Could not disable paginator buttons: {e}")
+
+    async def _show(self, interaction: discord.Interaction):
+        self._refresh_buttons()
+        await interaction.response.edit_message(content=self.pages[self.index], view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.index = max(0, self.index - 1)
+        await self._show(interaction)
+
+    @discord.ui.button(label="1/1", style=discord.ButtonStyle.secondary, disabled=True)
+    async def page_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        pass # Page counter only
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.index = min(len(self.pages) - 1, self.index + 1)
+        await self._show(interaction)
 
 
 def get_mentions_asid(pings_string):
     # Regular expression to find content between <@& and >
     pattern = r"<@&([^>]*)>"
-    print(re.findall(pattern, pings_string))
     # Find all matches of the pattern
     return [int(role) for role in re.findall(pattern, pings_string)]
 
@@ -67,92 +234,431 @@ def get_user_mentions_asid(pings_string):
 # --- End FIX ---
 
 
-def get_GCs(guild, search_string='-group-chat'):
-    # Sort by category name first (None if no category), then by extracted number
-    def sortKey(channel):
-        try:
-            # Use category name (or a high value string if no category)
-            cat_name = channel.category.name if channel.category else '~~~ZZZ' # Sort no-category last
-            # Extract number, handle potential errors if pattern not found
-            match = re.search(r'-(\d+)-', channel.name)
-            num = int(match.group(1)) if match else float('inf') # Sort channels without number last
-            return (cat_name, num)
-        except Exception as e:
-            logger.error(f"Error sorting channel {channel.name}: {e}")
-            return ('~~~ZZZ', float('inf')) # Fallback sorting
-
-    matching_channels: list[discord.TextChannel] = []
-    if guild and guild.channels:
-        matching_channels = sorted(
-            [channel for channel in guild.channels
-             if isinstance(channel, discord.TextChannel) and search_string.lower() in channel.name.lower()],
-            key=sortKey
-        )
+MEMBER_QUERY_CHUNK = 100 # Gateway limit for query_members(user_ids=...)
+MEMBER_FETCH_CONCURRENCY = 5
 
-    result = []
-    for channel in matching_channels:
-        try:
-            # Extract number from channel name
-            match = re.search(r'-(\d+)-', channel.name)
-            if not match:
-                logger.warning(f"Could not extract number from channel name: {channel.name}")
-                continue # Skip channel if number pattern not found
+async def resolve_members(guild, user_ids):
+    """Resolve user IDs to members: cache first, then gateway queries in chunks of 100,
+    then a bounded concurrent REST fetch for the chunks whose query failed. IDs a query
+    answered without returning are not members of the guild.
 
-            channel_number = match.group(1)
-            # Create a regex pattern that matches 'team' followed anywhere by the number
-            pattern = re.compile(r'team.*' + re.escape(channel_number), re.IGNORECASE)
+    Returns (members, not_found_ids) where not_found_ids are strings for display.
+    """
+    user_ids = list(dict.fromkeys(user_ids)) # Dedupe, keep order
+    members = {}
+    missing = []
+    for user_id in user_ids:
+        member = guild.get_member(user_id) or member_lru.get(guild.id, user_id)
+        if member:
+            members[user_id] = member
+        else:
+            missing.append(user_id)
 
-            # Filter roles that match the regex pattern from channel overwrites
-            valid_roles = [role for role in channel.overwrites.keys() if isinstance(role, discord.Role) and
-                           pattern.search(role.name)]
+    unqueried = [] # IDs of chunks whose gateway query failed
+    for i in range(0, len(missing), MEMBER_QUERY_CHUNK):
+        chunk = missing[i:i + MEMBER_QUERY_CHUNK]
+        try:
+            for member in await guild.query_members(user_ids=chunk, limit=len(chunk), cache=not LEAN_MEMBERS):
+                members[member.id] = member
+        except (asyncio.TimeoutError, discord.ClientException) as e:
+            logger.warning("Gateway member query failed for %d ID(s), falling back to REST: %s", len(chunk), e)
+            unqueried.extend(chunk)
+
+    errors = {}
+    semaphore = asyncio.Semaphore(MEMBER_FETCH_CONCURRENCY)
+    async def fetch(user_id):
+        async with semaphore:
+            try:
+                members[user_id] = await guild.fetch_member(user_id)
+            except discord.NotFound:
+                pass
+            except discord.HTTPException as e:
+                logger.error("HTTP error fetching member %s: %s", user_id, e)
+                errors[user_id] = e
+    await asyncio.gather(*(fetch(user_id) for user_id in unqueried if user_id not in members))
+
+    resolved = [members[user_id] for user_id in user_ids if user_id in members]
+    if LEAN_MEMBERS:
+        for member in resolved:
+            member_lru.put(member)
+    not_found_ids = [f"{user_id} (fetch error)" if user_id in errors else str(user_id)
+                     for user_id in user_ids if user_id not in members]
+    return resolved, not_found_ids
+
+
+def get_GCs(guild):
+    """Group chat channels and their matching team roles: [{'channel': channel, 'role': [roles]}].
+
+    Served from the event-maintained index, matched with the guild's group chat rules.
+    """
+    with GET_GCS_DURATION.time():
+        return gc_index.get_GCs(guild)
+
+async def send_message_to_channel(channel, message) -> DeliveryResult:
+    """Send a message to a specific channel through the channel delivery engine."""
+    result = await channel_engine.send_one(channel.id, lambda: channel.send(message))
+    MESSAGES_SENT.inc(kind='channel', status=result.status)
+    channel_log.note(result.status, channel.name, result.error, result.attempts)
+    return result
 
-            result.append({"channel": channel, "role": valid_roles if valid_roles else []})
-        except Exception as e:
-            logger.error(f"Error processing channel {channel.name} for GCs: {e}")
 
+async def send_message(member, message) -> DeliveryResult:
+    """DM one member through the rate-limited delivery engine and return the outcome."""
+    if member.bot: # Don't try to DM bots
+        MESSAGES_SENT.inc(kind='dm', status=SKIPPED)
+        dm_log.note(SKIPPED, member.name)
+        return DeliveryResult(member.id, SKIPPED)
+    async def send():
+        if member.dm_channel is None:
+            # The first DM to a member opens the DM channel first: a second request
+            await dm_engine.acquire_global()
+            await member.create_dm()
+        await member.send(message)
+    result = await dm_engine.send_one(member.id, send)
+    MESSAGES_SENT.inc(kind='dm', status=result.status)
+    dm_log.note(result.status, member.name, result.error, result.attempts)
     return result
 
-async def send_message_to_channel(channel, message):
-    """Send a message to a specific channel."""
-    try:
-        await channel.send(message)
-        # logger.info(f"Message sent to channel: {channel.name}") # Can be noisy
-    except discord.Forbidden:
-        logger.warning(f"Failed to send message to {channel.name}, permission denied.")
-    except discord.HTTPException as e:
-        logger.error(f"HTTP error sending to {channel.name}: {e}")
-    except Exception as e:
-        logger.error(f"Unexpected error sending to {channel.name}: {e}")
+def format_delivery_summary(counts) -> str:
+    """Summary line from outcome counts (see Outbox.counts())."""
+    summary = (f"Finished sending DMs. Success: {counts.get(SENT, 0)}, Failed: {counts.get(FAILED, 0)}, "
+               f"DMs closed: {counts.get(FORBIDDEN, 0)}, Skipped (bots): {counts.get(SKIPPED, 0)}.")
+    if counts.get(SUPPRESSED):
+        summary += f"\nNot attempted (DMs known closed): {counts[SUPPRESSED]}. Use `retryclosed` to try them anyway."
+    if counts.get(outbox.PENDING):
+        summary += f"\nCancelled before sending to {counts[outbox.PENDING]} member(s)."
+    return summary
+
+# --- Campaigns (durable fan-outs) ---
+# Every DM or channel fan-out is written to the outbox first, then drained from it,
+# so a restart mid-way resumes with only the recipients that weren't reached yet.
+
+async def _resolve_dm_target(guild, user_id):
+    target = (guild.get_member(user_id) or member_lru.get(guild.id, user_id) if guild else None) or bot.get_user(user_id)
+    if target is None:
+        try:
+            target = await bot.fetch_user(user_id)
+        except discord.HTTPException as e:
+            logger.error("Could not resolve user %s for DM: %s", user_id, e)
+    return target
+
+CAMPAIGN_PROGRESS_INTERVAL = 5 # Seconds between edits of a campaign's progress message
+
+@dataclasses.dataclass
+class CampaignJob:
+    """A campaign being delivered from this process, for progress reports and cancellation."""
+    campaign_id: int
+    source: Optional[str]
+    guild_id: Optional[int]
+    total: int
+    started_at: float = dataclasses.field(default_factory=time.monotonic)
+    counts: Counter = dataclasses.field(default_factory=Counter)
+    task: Optional[asyncio.Task] = None
+    cancelled_by: Optional[str] = None
+
+    def progress(self) -> str:
+        done = sum(self.counts.values())
+        failed = self.counts[FAILED] + self.counts[FORBIDDEN]
+        return format_campaign_progress(self.campaign_id, self.source, done - failed, failed,
+                                        self.total - done, time.monotonic() - self.started_at)
+
+# Campaign id -> job, while it runs
+campaign_jobs: dict[int, CampaignJob] = {}
+
+def format_campaign_progress(campaign_id, source, sent, failed, remaining, elapsed) -> str:
+    done = sent + failed
+    eta = format_delay(remaining * elapsed / done) if done and remaining else "-"
+    return f"Campaign #{campaign_id} ({source}): {sent} sent, {failed} failed, {remaining} remaining, ETA {eta}"
+
+def cancel_campaign(campaign_id, cancelled_by) -> bool:
+    """Stop a running campaign: queued sends are dropped and the rest of its recipients are never sent to.
+
+    Works for campaigns sent by delivery workers too, which only claim messages of running campaigns.
+    Returns False if the campaign wasn't running.
+    """
+    job = campaign_jobs.get(campaign_id)
+    if job is not None:
+        job.cancelled_by = str(cancelled_by)
+        job.task.cancel()
+    cancelled = campaign_outbox.finish(campaign_id, outbox.CANCELLED)
+    if cancelled:
+        logger.info(f"Campaign {campaign_id} cancelled by {cancelled_by}.")
+    return cancelled
+
+class CampaignCancelView(discord.ui.View):
+    def __init__(self, campaign_id: int):
+        # Campaign jobs only live as long as this process, so the view isn't re-attached on startup
+        super().__init__(timeout=None)
+        self.campaign_id = campaign_id
+        self.cancel_button.custom_id = f"cancel_campaign_{campaign_id}" # Unique ID per campaign
+
+    @discord.ui.button(label="Cancel Campaign", style=discord.ButtonStyle.danger) # custom_id set in __init__
+    async def cancel_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        """Cancels the associated campaign by ID."""
+        button.disabled = True
+        if cancel_campaign(self.campaign_id, f"{interaction.user} (ID: {interaction.user.id})"):
+            button.label = "Cancelled"
+            await interaction.response.edit_message(view=self)
+            await interaction.followup.send("Campaign cancelled, no further messages will be sent.", ephemeral=True)
+        else:
+            button.label = "Finished/Cancelled"
+            await interaction.response.edit_message(view=self)
+            await interaction.followup.send("This campaign has already finished or was cancelled.", ephemeral=True)
+        self.stop()
 
+async def _report_progress(job: CampaignJob, message):
+    """Edit the progress message every CAMPAIGN_PROGRESS_INTERVAL seconds while the job runs."""
+    while True:
+        await asyncio.sleep(CAMPAIGN_PROGRESS_INTERVAL)
+        try:
+            await message.edit(content=job.progress())
+        except discord.HTTPException as e:
+            # Interaction tokens expire after 15 minutes; the campaign carries on regardless
+            logger.info(f"Campaign {job.campaign_id}: stopped progress updates ({e}).")
+            return
 
-async def send_message(member, message):
-    if member.bot: # Don't try to DM bots
-        # logger.info(f"Skipping DM to bot: {member.name}")
+async def run_campaign(campaign_id, targets=None, interaction=None) -> dict:
+    """Deliver every pending recipient of a campaign and record each outcome as it happens.
+
+    `targets` optionally maps recipient IDs to already-resolved members/channels. With
+    `interaction`, a progress message with a cancel button is kept up to date as a followup.
+    Returns the campaign's counts by recipient state.
+    """
+    campaign = campaign_outbox.get(campaign_id)
+    guild = bot.get_guild(campaign.guild_id) if campaign.guild_id else None
+    targets = targets or {}
+    pending = campaign_outbox.pending(campaign_id)
+    job = CampaignJob(campaign_id, campaign.source, campaign.guild_id, total=len(pending))
+
+    async def deliver_one(item):
+        recipient_id, content = item
+        text = content or campaign.message
+        if campaign.kind == outbox.DM_CAMPAIGN:
+            target = targets.get(recipient_id) or await _resolve_dm_target(guild, recipient_id)
+            result = await send_message(target, text) if target else DeliveryResult(recipient_id, FAILED, error="User not found")
+            campaign_outbox.note_reachability(result, UNREACHABLE_TTL)
+        else:
+            channel = targets.get(recipient_id) or bot.get_channel(recipient_id)
+            result = await send_message_to_channel(channel, text) if channel else DeliveryResult(recipient_id, FAILED, error="Channel not found")
+        campaign_outbox.record(campaign_id, result)
+        job.counts[result.status] += 1
+        return result
+
+    engine = dm_engine if campaign.kind == outbox.DM_CAMPAIGN else channel_engine
+    job.task = asyncio.create_task(engine.deliver(pending, deliver_one), name=f"campaign_{campaign_id}")
+    campaign_jobs[campaign_id] = job
+    message = view = reporter = None
+    if interaction is not None:
+        view = CampaignCancelView(campaign_id)
+        try:
+            message = await interaction.followup.send(job.progress(), view=view, ephemeral=True, wait=True)
+            reporter = asyncio.create_task(_report_progress(job, message))
+        except discord.HTTPException as e:
+            logger.warning(f"Campaign {campaign_id}: could not post a progress message: {e}")
+    try:
+        await job.task
+    except asyncio.CancelledError:
+        if job.cancelled_by is None:
+            raise # This coroutine itself was cancelled, not just the job
+    finally:
+        del campaign_jobs[campaign_id]
+        if reporter is not None:
+            reporter.cancel()
+        (dm_log if campaign.kind == outbox.DM_CAMPAIGN else channel_log).flush()
+    campaign_outbox.finish(campaign_id)
+
+    if message is not None:
+        prefix = f"Cancelled by {job.cancelled_by}. " if job.cancelled_by else "Done. "
+        if not view.is_finished():
+            view.cancel_button.disabled = True
+            view.stop()
+        try:
+            await message.edit(content=prefix + job.progress(), view=view)
+        except discord.HTTPException:
+            pass # Token expired; the result is still sent as a followup by the command
+    return campaign_outbox.counts(campaign_id)
+
+async def dm_campaign(guild, message, members, source, retry_closed=False, interaction=None):
+    """Record a DM campaign and deliver it, unless delivery workers do.
+
+    Bots are recorded as skipped, and so are members whose DMs were found closed within
+    UNREACHABLE_TTL, unless `retry_closed` is set. With `interaction`, progress is
+    reported there (see run_campaign).
+    Returns (campaign id, counts), with counts None when the campaign was only queued.
+    """
+    unreachable = set() if retry_closed else campaign_outbox.unreachable()
+    recipients, skipped = [], []
+    for member in members:
+        if member.bot:
+            skipped.append((member.id, SKIPPED))
+        elif member.id in unreachable:
+            skipped.append((member.id, SUPPRESSED))
+        else:
+            recipients.append((member.id, None))
+    campaign_id = campaign_outbox.create_campaign(
+        outbox.DM_CAMPAIGN, guild.id, message, recipients, source=source, skipped=skipped)
+    if DELIVERY_MODE == 'queue':
+        return campaign_id, None
+    return campaign_id, await run_campaign(campaign_id, {member.id: member for member in members}, interaction)
+
+def format_campaign_result(campaign_id, counts) -> str:
+    if counts is None:
+        suppressed = campaign_outbox.counts(campaign_id).get(SUPPRESSED, 0)
+        note = f" {suppressed} member(s) with DMs known closed were left out." if suppressed else ""
+        return f"Queued as campaign #{campaign_id}; the delivery workers will send the DMs.{note}"
+    return format_delivery_summary(counts)
+
+async def send_campaign_result(interaction: discord.Interaction, campaign_id, counts):
+    """Send a campaign's final summary as a followup, or by DM to the admin once the token has expired."""
+    text = format_campaign_result(campaign_id, counts)
+    try:
+        await interaction.followup.send(text, ephemeral=True)
         return
+    except discord.HTTPException as e:
+        # Interaction tokens expire after 15 minutes, long before a large campaign finishes
+        logger.info(f"Campaign {campaign_id}: followup failed ({e}), sending the summary by DM.")
+    logger.info(f"Campaign {campaign_id}: {text}") # Don't post admin-only notes publicly
     try:
-        await member.send(message)
-        logger.info(f"DM sent to: {member.name}")
-    except discord.Forbidden:
-        logger.error(f"Could not send DM to {member.name}: Forbidden (DMs likely disabled).")
+        await interaction.user.send(f"Campaign #{campaign_id} in {interaction.guild.name}: {text}"[:MESSAGE_LIMIT])
     except discord.HTTPException as e:
-         logger.error(f"Could not send DM to {member.name}: HTTPException {e}")
-    except Exception as e:
-        logger.error(f"Unexpected error sending DM to {member.name}: {e}")
+        logger.info(f"Campaign {campaign_id}: could not DM the summary to {interaction.user}: {e}")
+
+async def resume_campaigns():
+    """Finish campaigns that were interrupted by a restart."""
+    for campaign in campaign_outbox.running():
+        logger.info(f"Resuming campaign {campaign.id} ({campaign.source}) with {len(campaign_outbox.pending(campaign.id))} pending recipient(s).")
+        try:
+            counts = await run_campaign(campaign.id)
+            logger.info(f"Resumed campaign {campaign.id} finished: {counts}")
+        except Exception as e:
+            logger.error(f"Error resuming campaign {campaign.id}: {e}", exc_info=True)
 
 # --- End Helper Functions ---
 
 
 @bot.event
-async def on_ready():
-    print(f"Logged in as {bot.user}")
+async def setup_hook():
+    """Runs once per process, after login and before the gateway connects (unlike on_ready,
+    which fires again on every reconnect)."""
+    global metrics_runner, startup_task
+    bot.add_dynamic_items(CancelReminderButton) # Reminder cancel buttons, including those sent before a restart
+    pruned = campaign_outbox.prune(OUTBOX_RETENTION)
+    if pruned:
+        logger.info(f"Pruned {pruned} finished campaign(s) from the outbox.")
+    if METRICS_PORT:
+        try:
+            metrics_runner = await metrics.start_http_server(METRICS_PORT, METRICS_HOST)
+        except OSError as e:
+            logger.error(f"Could not start metrics endpoint on {METRICS_HOST}:{METRICS_PORT}: {e}")
+    await sync_app_commands()
+    startup_task = asyncio.create_task(start_when_ready(), name="start_when_ready")
+
+async def start_when_ready():
+    """Start reminder dispatch and resume interrupted campaigns once guilds are cached."""
+    await bot.wait_until_ready()
+    reminder_scheduler.start()
+    load_reminder_window.start()
+    if DELIVERY_MODE == 'inline': # In queue mode the workers pick interrupted campaigns up themselves
+        await resume_campaigns()
+
+async def sync_app_commands():
+    """Sync slash commands only if they changed since the last sync (see command_sync.py).
+
+    With DEV_GUILD_ID set, commands are copied to and synced with that guild only, which
+    takes effect immediately, instead of globally.
+    """
+    guild = discord.Object(id=DEV_GUILD_ID) if DEV_GUILD_ID else None
+    if guild:
+        bot.tree.copy_global_to(guild=guild)
     try:
-        # Sync specific guild or globally if needed
-        # synced = await bot.tree.sync(guild=discord.Object(id=YOUR_GUILD_ID)) # Example for one guild
-        synced = await bot.tree.sync() # Sync globally
-        print(f"Synced: {len(synced)} command(s)")
+        synced = await sync_if_changed(bot.tree, COMMAND_SYNC_STATE_PATH, guild=guild, force=FORCE_COMMAND_SYNC)
+        if synced is not None:
+            print(f"Synced: {len(synced)} command(s)" + (f" to guild {DEV_GUILD_ID}" if guild else ""))
     except Exception as e:
         print(f"Error syncing commands: {e}")
 
+@bot.event
+async def on_ready():
+    print(f"Logged in as {bot.user}")
+
+# Slash command sync: skipped when the tree's hash matches the last sync stored here
+COMMAND_SYNC_STATE_PATH = os.getenv('COMMAND_SYNC_STATE', '.command_sync.json')
+FORCE_COMMAND_SYNC = os.getenv('FORCE_COMMAND_SYNC', '').lower() in ('1', 'true', 'yes')
+DEV_GUILD_ID = int(os.getenv('DEV_GUILD_ID', '0')) # Sync to this guild only, for development
+startup_task = None
+
+
+# Prometheus endpoint (GET /metrics); disabled unless METRICS_PORT is set
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+metrics_runner = None
+BOT_STARTED_AT = datetime.datetime.now(datetime.timezone.utc)
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    # Measured from when Discord created the interaction, so it includes gateway delivery
+    latency = (datetime.datetime.now(datetime.timezone.utc) - interaction.created_at).total_seconds()
+    COMMAND_LATENCY.observe(latency, command=command.qualified_name)
+
+
+# --- Index maintenance ---
+
+@bot.event
+async def on_guild_available(guild):
+    gc_index.build(guild)
+    if not LEAN_MEMBERS: # Without a member cache there is nothing to index
+        role_index.build(guild)
+
+@bot.event
+async def on_guild_join(guild):
+    gc_index.build(guild)
+    if not LEAN_MEMBERS:
+        role_index.build(guild)
+
+@bot.event
+async def on_guild_remove(guild):
+    gc_index.forget_guild(guild.id)
+    role_index.forget_guild(guild.id)
+    member_lru.forget_guild(guild.id)
+
+@bot.event
+async def on_guild_channel_create(channel):
+    gc_index.channel_changed(channel)
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    gc_index.channel_changed(after)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    gc_index.channel_deleted(channel)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    if before.name != after.name:
+        gc_index.role_changed(after)
+
+@bot.event
+async def on_guild_role_delete(role):
+    gc_index.role_changed(role)
+    role_index.role_deleted(role)
+
+@bot.event
+async def on_member_join(member):
+    role_index.member_joined(member)
+
+@bot.event
+async def on_member_update(before, after):
+    role_index.member_updated(before, after)
+
+@bot.event
+async def on_member_remove(member):
+    role_index.member_removed(member)
+
+@bot.event
+async def on_raw_member_remove(payload):
+    member_lru.discard(payload.guild_id, payload.user.id)
+
 
 # Test ping command
 @bot.tree.command(name='ping')
@@ -160,11 +666,62 @@ async def ping(interaction: discord.Interaction):
     await interaction.response.send_message(f"{round(bot.latency * 1000)}ms {interaction.user.mention}!")
 
 
+def _format_ms(seconds):
+    if seconds is None:
+        return "-"
+    return ">60s" if seconds == float('inf') else f"<={seconds * 1000:.0f}ms"
+
+@bot.tree.command(name='stats', description='Show bot performance counters.')
+@app_commands.checks.has_permissions(administrator=True)
+async def stats(interaction: discord.Interaction):
+    """Summary of the metrics registry (the same numbers the /metrics endpoint exposes)."""
+    uptime = datetime.datetime.now(datetime.timezone.utc) - BOT_STARTED_AT
+    lines = [
+        f"Uptime: {format_delay(uptime.total_seconds())}   Gateway latency: {round(bot.latency * 1000)}ms",
+        f"Guilds: {len(bot.guilds)}",
+        "",
+        "Commands (count, p50, p95):",
+    ]
+    for labels in sorted(COMMAND_LATENCY.label_sets(), key=lambda l: l['command']):
+        lines.append(f"  /{labels['command']:<14} {COMMAND_LATENCY.count(**labels):>6}  "
+                     f"{_format_ms(COMMAND_LATENCY.quantile(0.5, **labels)):>9}  {_format_ms(COMMAND_LATENCY.quantile(0.95, **labels)):>9}")
+    lines += [
+        "",
+        f"get_GCs calls: {GET_GCS_DURATION.count()}  p95 {_format_ms(GET_GCS_DURATION.quantile(0.95))}",
+        f"DMs: sent {MESSAGES_SENT.value(kind='dm', status=SENT):.0f}, failed {MESSAGES_SENT.value(kind='dm', status=FAILED):.0f}, "
+        f"DMs closed {MESSAGES_SENT.value(kind='dm', status=FORBIDDEN):.0f}",
+        f"Channel messages: sent {MESSAGES_SENT.value(kind='channel', status=SENT):.0f}, "
+        f"failed {MESSAGES_SENT.value(kind='channel', status=FAILED) + MESSAGES_SENT.value(kind='channel', status=FORBIDDEN):.0f}",
+        f"429s: {RATE_LIMITED.total():.0f} (global {RATE_LIMITED.value(scope='global'):.0f}), retry_after total {RETRY_AFTER_SECONDS.total():.1f}s",
+        "",
+        f"Scheduler queue depth: {len(reminder_scheduler)}",
+        f"Reminders fired: {REMINDER_LATENESS.count()}  lateness p50 {_format_ms(REMINDER_LATENESS.quantile(0.5))}, "
+        f"p95 {_format_ms(REMINDER_LATENESS.quantile(0.95))}",
+    ]
+    await interaction.response.send_message("```\n" + "\n".join(lines) + "\n```", ephemeral=True)
+
+@stats.error
+async def stats_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    if isinstance(error, app_commands.MissingPermissions):
+        await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
+    else:
+        logger.error(f"Error in stats command: {error}", exc_info=True)
+        if not interaction.response.is_done():
+            await interaction.response.send_message("An unexpected error occurred.", ephemeral=True)
+
+
 # send dm to each member with the specified roles with a message, doesnt accept user mentions, only role mentions
 @bot.tree.command(name='senddmbyrole')
-@app_commands.describe(message='The message to be sent to each role Member', rolesstring='Enter as many roles as you wish to DM')
+@app_commands.describe(
+    message='The message to be sent to each role Member',
+    rolesstring='Enter as many roles as you wish to DM',
+    excluderoles='Skip members who have any of these roles',
+    requireall='Only DM members who have every role in rolesstring (default: any of them)',
+    retryclosed='Also try members whose DMs were recently found closed (skipped by default)',
+)
 @app_commands.checks.has_permissions(administrator=True) # Example permission check
-async def senddmbyrole(interaction: discord.Interaction, message: str, rolesstring: str):
+async def senddmbyrole(interaction: discord.Interaction, message: str, rolesstring: str,
+                       excluderoles: str = None, requireall: bool = False, retryclosed: bool = False):
     """ Sends a DM to all members with the specified roles. """
     guild = interaction.guild
     if not guild:
@@ -183,29 +740,28 @@ async def senddmbyrole(interaction: discord.Interaction, message: str, rolesstri
         await interaction.response.send_message("None of the mentioned roles were found in this server.", ephemeral=True)
         return
 
-    members_to_dm = set()
-    for role in roles:
-        # Ensure members intent is working and cache is populated
-        # Fetch members if necessary, though role.members should work if intents/cache are okay
-        # await guild.chunk() # Might be needed if cache is incomplete, use cautiously
-        for member in role.members:
-            members_to_dm.add(member)
+    # Defer first: fetching the audience without a member cache can take longer than 3 seconds
+    await interaction.response.defer(ephemeral=True, thinking=True)
+
+    # Audience = union (or intersection) of the roles, minus excluded roles
+    exclude_ids = get_mentions_asid(excluderoles) if excluderoles else []
+    if LEAN_MEMBERS:
+        members_to_dm = await fetch_role_members(guild, [role.id for role in roles], exclude_ids, require_all=requireall)
+        for member in members_to_dm:
+            member_lru.put(member)
+    else:
+        member_ids = role_index.query(guild, [role.id for role in roles], exclude_ids, require_all=requireall)
+        members_to_dm = [member for member in map(guild.get_member, member_ids) if member is not None]
 
     if not members_to_dm:
-        await interaction.response.send_message("No members found with the specified roles.", ephemeral=True)
+        await interaction.followup.send("No members found with the specified roles.", ephemeral=True)
         return
 
-    await interaction.response.send_message(f"Sending DMs to {len(members_to_dm)} members... This may take a moment.", ephemeral=True)
+    await interaction.followup.send(f"Sending DMs to {len(members_to_dm)} members... This may take a moment.", ephemeral=True)
 
-    tasks = [send_message(member, message) for member in members_to_dm]
-    # Gather tasks with error handling if needed, though send_message has some
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-
-    # Count successes/failures (optional)
-    success_count = sum(1 for r in results if r is None) # send_message returns None on success
-    fail_count = len(results) - success_count
-
-    await interaction.followup.send(f"Finished sending DMs. Success: {success_count}, Failed/Skipped: {fail_count}.", ephemeral=True)
+    campaign_id, counts = await dm_campaign(guild, message, members_to_dm, source='senddmbyrole', retry_closed=retryclosed,
+                                            interaction=interaction)
+    await send_campaign_result(interaction, campaign_id, counts)
 
 @senddmbyrole.error
 async def senddmbyrole_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
@@ -221,9 +777,13 @@ async def senddmbyrole_error(interaction: discord.Interaction, error: app_comman
 
 # send dm to each member with the specified users with a message, doesnt accept role mentions, only user mentions
 @bot.tree.command(name='senddm')
-@app_commands.describe(message='The message to be sent to each member', usersstring='Enter as many users as you wish to DM')
+@app_commands.describe(
+    message='The message to be sent to each member',
+    usersstring='Enter as many users as you wish to DM',
+    retryclosed='Also try users whose DMs were recently found closed (skipped by default)',
+)
 @app_commands.checks.has_permissions(administrator=True) # Example permission check
-async def senddm(interaction: discord.Interaction, message: str, usersstring: str):
+async def senddm(interaction: discord.Interaction, message: str, usersstring: str, retryclosed: bool = False):
     """ Sends a DM to all specified users. """
     guild = interaction.guild
     if not guild:
@@ -238,44 +798,23 @@ async def senddm(interaction: discord.Interaction, message: str, usersstring: st
         await interaction.response.send_message("No valid user mentions found in the input.", ephemeral=True)
         return
 
-    # Fetch members using IDs
-    members_to_dm = []
-    not_found_ids = []
-    for user_id in user_ids:
-        member = guild.get_member(user_id)
-        if member:
-            members_to_dm.append(member)
-        else:
-            # Try fetching if not in cache (requires members intent)
-            try:
-                member = await guild.fetch_member(user_id)
-                if member:
-                    members_to_dm.append(member)
-                else:
-                    not_found_ids.append(str(user_id))
-            except discord.NotFound:
-                not_found_ids.append(str(user_id))
-            except discord.HTTPException as e:
-                 logger.error(f"HTTP error fetching member {user_id}: {e}")
-                 not_found_ids.append(f"{user_id} (fetch error)")
-
+    # Defer first: resolving uncached members can take longer than the 3-second interaction deadline
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    members_to_dm, not_found_ids = await resolve_members(guild, user_ids)
 
     if not members_to_dm:
-        await interaction.response.send_message("None of the mentioned users could be found in this server.", ephemeral=True)
+        await interaction.followup.send("None of the mentioned users could be found in this server.", ephemeral=True)
         return
 
-    await interaction.response.send_message(f"Sending DMs to {len(members_to_dm)} members... This may take a moment.", ephemeral=True)
-
     if not_found_ids:
-        await interaction.followup.send(f"Note: Could not find users with IDs: {', '.join(not_found_ids)}", ephemeral=True)
+        shown = ', '.join(not_found_ids[:50]) + (f" ...and {len(not_found_ids) - 50} more" if len(not_found_ids) > 50 else "")
+        await interaction.followup.send(f"Note: Could not find users with IDs: {shown}", ephemeral=True)
 
-    tasks = [send_message(member, message) for member in members_to_dm]
-    results = await asyncio.gather(*tasks, return_exceptions=True) # Removed unnecessary batching
+    await interaction.followup.send(f"Sending DMs to {len(members_to_dm)} members... This may take a moment.", ephemeral=True)
 
-    success_count = sum(1 for r in results if r is None)
-    fail_count = len(results) - success_count
-
-    await interaction.followup.send(f"Finished sending DMs. Success: {success_count}, Failed/Skipped: {fail_count}.", ephemeral=True)
+    campaign_id, counts = await dm_campaign(guild, message, members_to_dm, source='senddm', retry_closed=retryclosed,
+                                            interaction=interaction)
+    await send_campaign_result(interaction, campaign_id, counts)
 
 @senddm.error
 async def senddm_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
@@ -289,6 +828,54 @@ async def senddm_error(interaction: discord.Interaction, error: app_commands.App
             await interaction.followup.send("An unexpected error occurred.", ephemeral=True)
 
 
+@bot.tree.command(name='campaigns', description='List running DM and reminder campaigns, or cancel one.')
+@app_commands.describe(cancel='ID of a running campaign to cancel')
+@app_commands.checks.has_permissions(administrator=True)
+async def campaigns(interaction: discord.Interaction, cancel: Optional[int] = None):
+    """Lists this server's running campaigns with their progress."""
+    guild = interaction.guild
+    if not guild:
+        await interaction.response.send_message("Command must be used within a server.", ephemeral=True)
+        return
+
+    running = [campaign for campaign in campaign_outbox.running() if campaign.guild_id == guild.id]
+    if cancel is not None:
+        if cancel not in {campaign.id for campaign in running}:
+            await interaction.response.send_message(f"No running campaign #{cancel} in this server.", ephemeral=True)
+        elif cancel_campaign(cancel, f"{interaction.user} (ID: {interaction.user.id})"):
+            await interaction.response.send_message(f"Campaign #{cancel} cancelled, no further messages will be sent.", ephemeral=True)
+        else:
+            await interaction.response.send_message(f"Campaign #{cancel} has already finished.", ephemeral=True)
+        return
+
+    if not running:
+        await interaction.response.send_message("No campaigns are running.", ephemeral=True)
+        return
+    now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+    lines = []
+    for campaign in running:
+        job = campaign_jobs.get(campaign.id)
+        if job is not None:
+            lines.append(job.progress())
+            continue
+        # Sent by delivery workers (or waiting to be resumed): progress from the outbox
+        counts = campaign_outbox.counts(campaign.id)
+        failed = counts.get(FAILED, 0) + counts.get(FORBIDDEN, 0)
+        remaining = counts.get(outbox.PENDING, 0) + counts.get(outbox.CLAIMED, 0)
+        lines.append(format_campaign_progress(campaign.id, campaign.source, counts.get(SENT, 0), failed, remaining,
+                                              now - campaign.created_at))
+    await interaction.response.send_message("\n".join(lines)[:MESSAGE_LIMIT], ephemeral=True)
+
+@campaigns.error
+async def campaigns_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    if isinstance(error, app_commands.MissingPermissions):
+        await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
+    else:
+        logger.error(f"Error in campaigns command: {error}", exc_info=True)
+        if not interaction.response.is_done():
+            await interaction.response.send_message("An unexpected error occurred.", ephemeral=True)
+
+
 @bot.tree.command(name='verifyroles', description='Verify each role against the channel name.')
 @app_commands.checks.has_permissions(manage_channels=True, manage_roles=True) # Example permissions
 async def verifyroles(interaction: discord.Interaction):
@@ -297,13 +884,15 @@ async def verifyroles(interaction: discord.Interaction):
     if guild:
         await interaction.response.defer(ephemeral=True) # Defer if get_GCs might take time
         results = get_GCs(guild)
-        response = format_GCs_results(results)
-        if not response:
-            response = "No channels found matching '-group-chat' or no roles match the 'team + number' criteria."
-        # Ensure response isn't too long for a single message
-        if len(response) > 1950:
-             response = response[:1950] + "\n... (output truncated)"
-        await interaction.followup.send(response, ephemeral=True)
+        pages = format_GCs_pages(results)
+        if not pages:
+            await interaction.followup.send(f"No group chats found. Current rules: {gc_rules.get(guild.id).describe()} (change them with /grouprules).", ephemeral=True)
+        elif len(pages) == 1:
+            await interaction.followup.send(pages[0], ephemeral=True)
+        else:
+            # Pages are built once here; the view just flips between them
+            view = PaginatorView(pages, interaction.user.id)
+            view.message = await interaction.followup.send(pages[0], view=view, ephemeral=True, wait=True)
     else:
          await interaction.response.send_message("Command must be used within a server.", ephemeral=True)
 
@@ -319,128 +908,356 @@ async def verifyroles_error(interaction: discord.Interaction, error: app_command
             await interaction.followup.send("An unexpected error occurred.", ephemeral=True)
 
 
-# --- Reminder Cancellation Implementation ---
+@bot.tree.command(name='grouprules', description='Show or change how group chat channels and team roles are found.')
+@app_commands.describe(
+    channel="Text in group chat channel names (a regex if regex is set), e.g. '-group-chat'",
+    regex="Treat channel as a regular expression",
+    category="Only channels in categories whose name contains this",
+    number="Regex whose first group is the channel's number, e.g. '-(\\d+)-'",
+    roletemplate="Regex for the channel's team role names, {n} is the number, e.g. 'team.*{n}'",
+    reset="Go back to the default rules",
+)
+@app_commands.checks.has_permissions(administrator=True)
+async def grouprules(interaction: discord.Interaction, channel: Optional[str] = None, regex: Optional[bool] = None,
+                     category: Optional[str] = None, number: Optional[str] = None, roletemplate: Optional[str] = None,
+                     reset: bool = False):
+    """Shows this server's group chat rules, or changes the given parts of them."""
+    guild = interaction.guild
+    if not guild:
+        await interaction.response.send_message("Command must be used within a server.", ephemeral=True)
+        return
+
+    rules = DEFAULT_RULES if reset else gc_rules.get(guild.id)
+    changes = {'channel': channel, 'channel_regex': regex, 'category': category, 'number': number,
+               'role_template': roletemplate}
+    changes = {field: value for field, value in changes.items() if value is not None}
+    if 'category' in changes and not changes['category'].strip():
+        changes['category'] = None  # An empty category clears the filter
+    if not reset and not changes:
+        await interaction.response.send_message(f"Group chats are {rules.describe()}.", ephemeral=True)
+        return
+
+    rules = dataclasses.replace(rules, **changes)
+    try:
+        gc_rules.set(guild.id, rules)
+    except ValueError as e:
+        await interaction.response.send_message(f"Rules not changed: {e}", ephemeral=True)
+        return
+    except OSError as e:
+        logger.error(f"Could not save group chat rules to {GC_RULES_PATH}: {e}")
+        await interaction.response.send_message("Could not save the rules.", ephemeral=True)
+        return
+    logger.info(f"Group chat rules for guild {guild.id} set by {interaction.user} (ID: {interaction.user.id}): {rules}")
+    found = len(get_GCs(guild)) # Rebuilds the guild's index with the new rules
+    await interaction.response.send_message(f"Group chats are now {rules.describe()}.\n{found} group chat(s) match.",
+                                            ephemeral=True)
 
-# Dictionary to keep track of active reminder tasks {interaction_id: task}
-# Note: This is in-memory only. Reminders are lost on bot restart.
-active_reminder_tasks = {}
+@grouprules.error
+async def grouprules_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    if isinstance(error, app_commands.MissingPermissions):
+        await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
+    else:
+        logger.error(f"Error in grouprules command: {error}", exc_info=True)
+        if not interaction.response.is_done():
+            await interaction.response.send_message("An unexpected error occurred.", ephemeral=True)
 
-class CancelView(discord.ui.View):
-    def __init__(self, task_to_cancel: asyncio.Task, interaction_id: int):
-        # Timeout=None means the view persists until manually stopped or bot restarts
-        super().__init__(timeout=None)
-        self.task_to_cancel = task_to_cancel
-        self.interaction_id = interaction_id
-        self.cancel_button.custom_id = f"cancel_reminder_{interaction_id}" # Unique ID per reminder
 
-    @discord.ui.button(label="Cancel Reminder", style=discord.ButtonStyle.danger) # custom_id set in __init__
-    async def cancel_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        """Cancels the associated reminder task."""
-        if self.task_to_cancel and not self.task_to_cancel.done():
-            self.task_to_cancel.cancel()
-            logger.info(f"Reminder task {self.task_to_cancel.get_name()} cancelled by user {interaction.user} (ID: {interaction.user.id}).")
-            await interaction.response.send_message("Reminder cancelled successfully!", ephemeral=True)
-            # Optionally disable the button after cancellation
-            button.disabled = True
-            button.label = "Cancelled"
-            await interaction.edit_original_response(view=self)
-            # Remove from active tasks dict
-            if self.interaction_id in active_reminder_tasks:
-                del active_reminder_tasks[self.interaction_id]
+# --- Reminder Scheduling and Cancellation ---
+
+# Every reminder is persisted in a local SQLite store. Only reminders due within
+# REMINDER_LOAD_WINDOW seconds are held in the heap-based scheduler; a periodic
+# loader pulls later ones in as the window reaches them.
+REMINDER_DB_PATH = os.getenv('REMINDER_DB_PATH', 'reminders.db')
+REMINDER_LOAD_WINDOW = 60 * 60 # 1 hour; must be longer than the loader interval below
+# Reminders for the same guild due within this many seconds of each other are sent as one message
+REMINDER_COALESCE_WINDOW = float(os.getenv('REMINDER_COALESCE_SECONDS', '2'))
+MENTION_RESERVE = len(' <@&18446744073709551615>') # Room left for the role mention appended to reminder texts
+# Reminder targets are revalidated and their messages built this many seconds before they are due
+REMINDER_PREPARE_LEAD = float(os.getenv('REMINDER_PREPARE_SECONDS', '10'))
+reminder_store = ReminderStore(REMINDER_DB_PATH)
+
+class CancelReminderButton(discord.ui.DynamicItem[discord.ui.Button], template=r'cancel_reminder_(?P<id>\d+)'):
+    """Cancel button of a reminder. The reminder ID is in the custom_id, so one dynamic item
+    registered at startup handles the buttons of every reminder, without a view per reminder."""
+
+    def __init__(self, reminder_id: int):
+        super().__init__(discord.ui.Button(label="Cancel Reminder", style=discord.ButtonStyle.danger,
+                                           custom_id=f"cancel_reminder_{reminder_id}")) # Unique ID per reminder
+        self.reminder_id = reminder_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(int(match['id']))
+
+    async def callback(self, interaction: discord.Interaction):
+        """Cancels the associated reminder by ID."""
+        # The store is the source of truth; the scheduler only holds the near-due window
+        self.item.disabled = True
+        if reminder_store.mark(self.reminder_id, CANCELLED):
+            reminder_scheduler.cancel(self.reminder_id)
+            logger.info(f"Reminder {self.reminder_id} cancelled by user {interaction.user} (ID: {interaction.user.id}).")
+            self.item.label = "Cancelled"
+            await interaction.response.edit_message(view=self.view)
+            await interaction.followup.send("Reminder cancelled successfully!", ephemeral=True)
         else:
-            await interaction.response.send_message("This reminder has already finished or could not be cancelled.", ephemeral=True)
-            button.disabled = True
-            button.label = "Finished/Cancelled"
-            await interaction.edit_original_response(view=self)
+            self.item.label = "Finished/Cancelled"
+            await interaction.response.edit_message(view=self.view)
+            await interaction.followup.send("This reminder has already finished or could not be cancelled.", ephemeral=True)
 
-        # Stop the view from listening to further interactions for this button
-        self.stop()
+async def _notify_reminder(reminder: Reminder, text: str, ephemeral: bool = True):
+    """Report a reminder outcome: via the original interaction if we still have it, else in its channel."""
+    if reminder.interaction is not None:
+        try:
+            await reminder.interaction.followup.send(text, ephemeral=ephemeral)
+            return
+        except discord.HTTPException as e:
+            # Interaction tokens expire after 15 minutes
+            logger.info(f"Reminder {reminder.id}: followup failed ({e}), falling back to channel.")
+    if ephemeral:
+        logger.info(f"Reminder {reminder.id}: {text}") # Don't post admin-only notes publicly
+        return
+    channel = bot.get_channel(reminder.channel_id) if reminder.channel_id else None
+    if channel is not None:
+        await send_message_to_channel(channel, text)
+
+def _claim_reminder(reminder: Reminder) -> bool:
+    """Take the due occurrence out of the pending set. Returns False if the reminder was cancelled.
+
+    One-shot reminders are marked fired. Recurring ones are advanced to their next
+    occurrence (computed from the rule, not from the previous sleep) and rescheduled.
+    """
+    if not reminder.recurrence:
+        return reminder_store.mark(reminder.id, FIRED)
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    # Skip occurrences missed while the bot was down rather than firing them all at once
+    next_fire_at = next_occurrence(reminder.recurrence, reminder.dtstart or reminder.fire_at,
+                                   max(reminder.fire_at, now), reminder.timezone)
+    if next_fire_at is None:
+        logger.info(f"Reminder {reminder.id}: recurrence finished, this is the last occurrence.")
+        return reminder_store.mark(reminder.id, FIRED)
+    if not reminder_store.advance(reminder.id, next_fire_at):
+        return False
+    if (next_fire_at - now).total_seconds() <= REMINDER_LOAD_WINDOW:
+        reminder_scheduler.schedule(dataclasses.replace(reminder, fire_at=next_fire_at, interaction=None, prepared=None))
+    logger.info(f"Reminder {reminder.id}: next occurrence at {next_fire_at.isoformat()}.")
+    return True
+
+def _group_reminder_texts(reminders: list[Reminder]) -> list[list[Reminder]]:
+    """Split reminders into groups whose texts, one per line plus a role mention, fit in one message."""
+    groups, current, size = [], [], 0
+    for reminder in reminders:
+        length = len(reminder.message) + (1 if current else 0) # +1 for the newline
+        if current and size + length + MENTION_RESERVE > MESSAGE_LIMIT:
+            groups.append(current)
+            current, size, length = [], 0, len(reminder.message)
+        current.append(reminder)
+        size += length
+    if current:
+        groups.append(current)
+    return groups
+
+# --- Reminder targets ---
+# The group chats (and the team role mentioned in each) are resolved when a reminder is
+# set and stored with it. REMINDER_PREPARE_LEAD seconds before it is due, the stored ids
+# are revalidated against the cache and the messages built, so firing only has to send.
+
+def resolve_reminder_targets(guild) -> list[tuple[int, Optional[int]]]:
+    """(group chat channel id, id of the team role to mention or None) for every group chat."""
+    return [(item['channel'].id, item['role'][0].id if item['role'] else None) for item in get_GCs(guild)]
+
+def revalidate_reminder_targets(guild, targets) -> tuple[list, bool]:
+    """Check stored targets against the cache and the group chat index.
+
+    Channels that were deleted or are no longer group chats are dropped, a role that no
+    longer matches its channel is replaced by the channel's current team role, and group
+    chats created since are added. Returns ([(channel, role or None)], whether anything changed).
+    """
+    team_roles = gc_index.team_roles(guild)
+    resolved, seen, changed = [], set(), False
+    for channel_id, role_id in targets:
+        channel = guild.get_channel(channel_id)
+        role_ids = team_roles.get(channel_id)
+        if channel is None or role_ids is None:
+            changed = True
+            continue
+        seen.add(channel_id)
+        role = guild.get_role(role_id) if role_id in role_ids else None
+        if role is None:
+            role = next(filter(None, map(guild.get_role, role_ids)), None)
+            changed = changed or role is not None or role_id is not None
+        resolved.append((channel, role))
+    if len(seen) < len(team_roles):
+        for item in get_GCs(guild):
+            if item['channel'].id not in seen:
+                resolved.append((item['channel'], item['role'][0] if item['role'] else None))
+                changed = True
+    return resolved, changed
+
+def build_reminder_messages(task_name, message, targets) -> list[tuple[int, str]]:
+    """(channel id, content) per target: the text followed by the channel's team role mention."""
+    messages = []
+    for channel, role in targets:
+        if role is not None:
+            messages.append((channel.id, f"{message} <@&{role.id}>"))
+        else:
+            # Decide what to do if no role found: send without mention or skip?
+            logger.warning(f"Task {task_name}: No matching role found for channel {channel.name}, sending reminder without mention.")
+            messages.append((channel.id, message)) # Send without mention
+    return messages
+
+def describe_reminder_targets(guild, targets, limit=10) -> str:
+    """'Will post in N group chat(s): #channel (Role), ...' for the set_reminder reply (names, so nobody is pinged)."""
+    if not targets:
+        return "No group chat channels match right now; they're looked up again when it fires."
+    shown = []
+    for channel_id, role_id in targets[:limit]:
+        channel, role = guild.get_channel(channel_id), guild.get_role(role_id) if role_id else None
+        shown.append(f"#{channel.name if channel else channel_id} ({role.name if role else 'no role'})")
+    more = f", ...and {len(targets) - limit} more" if len(targets) > limit else ""
+    return f"Will post in {len(targets)} group chat(s): {', '.join(shown)}{more}."
+
+class PreparedReminder(NamedTuple):
+    targets: list # [(channel, role or None)], revalidated
+    messages: list # [(channel id, content)] for this reminder's text alone
+
+def _reminder_targets(guild, reminder: Reminder) -> list:
+    """Revalidated targets of a reminder, storing them again if they changed (or were never stored)."""
+    stored = reminder.targets if reminder.targets is not None else resolve_reminder_targets(guild)
+    targets, changed = revalidate_reminder_targets(guild, stored)
+    if changed or reminder.targets is None:
+        reminder.targets = [(channel.id, role.id if role else None) for channel, role in targets]
+        reminder_store.set_targets(reminder.id, reminder.targets)
+    return targets
+
+def _prepare_reminders(reminders: list[Reminder]):
+    """Scheduler prepare callback: revalidate targets and build the messages ahead of the deadline."""
+    guild = bot.get_guild(reminders[0].guild_id)
+    if guild is None:
+        return
+    for reminder in reminders:
+        targets = _reminder_targets(guild, reminder)
+        reminder.prepared = PreparedReminder(targets, build_reminder_messages(f"reminder_{reminder.id}", reminder.message, targets))
+
+async def _send_reminder_group(guild, reminders: list[Reminder], targets):
+    """Send one message per group chat channel carrying the texts of all `reminders`."""
+    task_name = "reminder_" + "+".join(str(reminder.id) for reminder in reminders)
+    message = "\n".join(reminder.message for reminder in reminders)
+    prepared = reminders[0].prepared
+    if len(reminders) == 1 and prepared is not None and prepared.targets is targets:
+        messages = prepared.messages
+    else:
+        messages = build_reminder_messages(task_name, message, targets)
+
+    combined = f" (combined with {len(reminders) - 1} other reminder(s) due at the same time)" if len(reminders) > 1 else ""
+    # Record the fan-out before sending, so a restart resumes it instead of losing or repeating it
+    campaign_id = campaign_outbox.create_campaign(
+        outbox.CHANNEL_CAMPAIGN, guild.id, message, messages,
+        source="reminder:" + ",".join(str(reminder.id) for reminder in reminders))
+    if DELIVERY_MODE == 'queue':
+        logger.info(f"Task {task_name}: Queued reminder campaign {campaign_id} for {len(messages)} channels.")
+        for reminder in reminders:
+            await _notify_reminder(reminder, f"Reminder queued for {len(messages)} channels{combined}.", ephemeral=False)
+        return
+    counts = await run_campaign(campaign_id, {channel.id: channel for channel, _ in targets})
+    sent = counts.get(SENT, 0)
+    if sent:
+        logger.info(f"Task {task_name}: Sent reminder messages to {sent} channels.")
+        for reminder in reminders:
+            await _notify_reminder(reminder, f"Reminder message sent to {sent} channels{combined}.", ephemeral=False) # Send confirmation publicly
+    else:
+        logger.info(f"Task {task_name}: No messages were sent ({counts}).")
+        for reminder in reminders:
+            await _notify_reminder(reminder, "Reminder triggered, but no messages could be sent (check channel/role setup?).")
+
+async def _fire_reminders(reminders: list[Reminder]):
+    """Called by the scheduler with the reminders of one guild that came due together.
+
+    The group chat channels are resolved once and the reminders' texts are merged into a
+    single message per channel (more only if the merged text would exceed MESSAGE_LIMIT).
+    """
+    # Claim each occurrence before sending so a crash mid-send doesn't resend on restart
+    claimed = []
+    for reminder in reminders:
+        if _claim_reminder(reminder):
+            claimed.append(reminder)
+        else:
+            logger.info(f"Task reminder_{reminder.id}: No longer pending in the store (cancelled?), skipping.")
+    if not claimed:
+        return
 
-async def _run_reminder_task(delay: float, guild: discord.Guild, message: str, interaction: discord.Interaction):
-    """The actual coroutine that waits and sends messages for a reminder."""
-    task_name = f"reminder_{interaction.id}"
+    task_name = "reminder_" + "+".join(str(reminder.id) for reminder in claimed)
+    guild = bot.get_guild(claimed[0].guild_id)
     try:
-        # Assign a name for easier identification in logs/debugging
-        asyncio.current_task().set_name(task_name)
-        logger.info(f"Task {task_name}: Starting reminder, sleeping for {delay:.2f} seconds.")
-        # Wait for the specified delay. If cancelled during sleep, raises CancelledError.
-        await asyncio.sleep(delay)
-
-        # If sleep completes without cancellation, proceed to send messages
-        logger.info(f"Task {task_name}: Waking up, fetching channels and sending messages.")
-        results = get_GCs(guild)
-        if not results:
-             logger.warning(f"Task {task_name}: No group chat channels found when reminder triggered.")
-             await interaction.followup.send("Reminder triggered, but no matching group chat channels were found.", ephemeral=True)
-             return
+        if guild is None:
+            logger.warning(f"Task {task_name}: Guild {claimed[0].guild_id} is no longer available, dropping reminder(s).")
+            return
 
-        tasks = []
-        for item in results:
-            channel = item['channel']
-            roles = item['role']
-            if roles: # Ensure there's at least one role to mention
-                # Mention the first role found associated with the channel
-                mention = f'<@&{roles[0].id}>'
-                tasks.append(send_message_to_channel(channel, f"{message} {mention}"))
-            else:
-                # Decide what to do if no role found: send without mention or skip?
-                logger.warning(f"Task {task_name}: No matching role found for channel {channel.name}, sending reminder without mention.")
-                tasks.append(send_message_to_channel(channel, message)) # Send without mention
-
-        if tasks:
-            await asyncio.gather(*tasks) # Send all messages concurrently
-            logger.info(f"Task {task_name}: Sent reminder messages to {len(tasks)} channels.")
-            await interaction.followup.send(f"Reminder message sent to {len(tasks)} channels.", ephemeral=False) # Send confirmation publicly
+        prepared = claimed[0].prepared
+        if prepared is not None and all(reminder.prepared is not None for reminder in claimed):
+            # Built moments ago; only drop channels deleted since
+            targets = prepared.targets
+            if any(guild.get_channel(channel.id) is None for channel, _ in targets):
+                targets = [(channel, role) for channel, role in targets if guild.get_channel(channel.id) is not None]
         else:
-             logger.info(f"Task {task_name}: No messages were sent (all channels lacked roles?).")
-             await interaction.followup.send("Reminder triggered, but no messages could be sent (check channel/role setup?).", ephemeral=True)
+            logger.info(f"Task {task_name}: Not prepared ahead, resolving channels now.")
+            targets = _reminder_targets(guild, claimed[0])
+        if not targets:
+            logger.warning(f"Task {task_name}: No group chat channels found when reminder triggered.")
+            for reminder in claimed:
+                await _notify_reminder(reminder, "Reminder triggered, but no matching group chat channels were found.")
+            return
 
-    except asyncio.CancelledError:
-        # This block executes if task.cancel() was called (e.g., by the button)
-        logger.info(f"Task {task_name}: Successfully cancelled.")
-        # Optionally send a confirmation that it was indeed cancelled via followup
-        try:
-            await interaction.followup.send("Reminder was cancelled.", ephemeral=True)
-        except discord.NotFound:
-             logger.warning(f"Task {task_name}: Could not send cancellation followup (original interaction deleted?).")
-        except Exception as e:
-             logger.error(f"Task {task_name}: Error sending cancellation followup: {e}")
+        for group in _group_reminder_texts(claimed):
+            await _send_reminder_group(guild, group, targets)
 
     except Exception as e:
-        # Catch any other unexpected errors during the task execution
+        # Catch any other unexpected errors during the reminder execution
         logger.error(f"Task {task_name}: An error occurred: {e}", exc_info=True)
-        try:
-            await interaction.followup.send(f"An error occurred while executing the reminder: {e}", ephemeral=True)
-        except Exception as followup_e:
-            logger.error(f"Task {task_name}: Failed to send error followup message: {followup_e}")
+        for reminder in claimed:
+            try:
+                await _notify_reminder(reminder, f"An error occurred while executing the reminder: {e}")
+            except Exception as followup_e:
+                logger.error(f"Task reminder_{reminder.id}: Failed to send error followup message: {followup_e}")
 
-    finally:
-        # Clean up: Remove the task from the tracking dictionary regardless of outcome
-        if interaction.id in active_reminder_tasks:
-            del active_reminder_tasks[interaction.id]
-            logger.info(f"Task {task_name}: Removed from active tasks.")
+reminder_scheduler = ReminderScheduler(_fire_reminders, coalesce_window=REMINDER_COALESCE_WINDOW,
+                                       prepare_callback=_prepare_reminders, prepare_lead=REMINDER_PREPARE_LEAD)
+metrics.SCHEDULER_QUEUE_DEPTH.set_function(lambda: len(reminder_scheduler))
 
+@tasks.loop(minutes=15)
+async def load_reminder_window():
+    """Move reminders that are due (or overdue) within the load window from the store into the scheduler."""
+    until = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=REMINDER_LOAD_WINDOW)
+    loaded = 0
+    for reminder in reminder_store.due_before(until):
+        if reminder.id not in reminder_scheduler:
+            reminder_scheduler.schedule(reminder)
+            loaded += 1
+    if loaded:
+        logger.info(f"Loaded {loaded} reminder(s) into the scheduler ({len(reminder_scheduler)} pending in window).")
+
+
+REMINDER_TIME_EXAMPLES = ['in 30 minutes', 'in 2 hours', 'tomorrow 10am EST', 'friday 6pm UTC']
 
 @bot.tree.command(name='set_reminder', description='Set a reminder to send messages to channels.')
 @app_commands.describe(
     reminder_time="When to send (e.g., 'in 2 hours', 'tomorrow 10am EST', '2025-12-25 09:00 PST')",
-    reminder_message="The message content to send (role mention will be added)."
+    reminder_message="The message content to send (role mention will be added).",
+    repeat=f"Repeat: {', '.join(PRESETS)} or an RRULE like 'FREQ=WEEKLY;BYDAY=MO,TH'. Leave empty for once.",
 )
 @app_commands.checks.has_permissions(administrator=True) # Example permission
-async def set_reminder(interaction: discord.Interaction, reminder_time: str, reminder_message: str):
-    """Sets a reminder to message all '-group-chat' channels at a specific time."""
+async def set_reminder(interaction: discord.Interaction, reminder_time: str, reminder_message: str, repeat: str = None):
+    """Sets a reminder to message all group chat channels at a specific time."""
     if not interaction.guild:
          await interaction.response.send_message("Command must be used within a server.", ephemeral=True)
          return
 
     try:
-        # Attempt to parse the user-provided time string
-        # Use dateutil.parser which is quite flexible
+        # Parse the user-provided time string (relative durations, day keywords, named zones; dateutil fallback)
         now_aware = datetime.datetime.now(datetime.timezone.utc) # Use timezone-aware current time (UTC)
 
         try:
-            # Let dateutil try to figure out timezone info if provided
-            reminder_dt_maybe_aware = dateutil.parser.parse(reminder_time)
+            parsed_time = parse_reminder_time(reminder_time, now_aware)
         except ValueError:
             await interaction.response.send_message(
                 "Invalid time format. Please use a format like 'YYYY-MM-DD HH:MM:SS TZ', 'in 5 minutes', 'tomorrow 3pm EST', etc.",
@@ -451,16 +1268,9 @@ async def set_reminder(interaction: discord.Interaction, reminder_time: str, rem
              await interaction.response.send_message("The specified date is too far in the future.", ephemeral=True)
              return
 
-        # If parsed time is naive, assume user meant bot's local time (or UTC as fallback)
-        # For simplicity, we'll assume UTC if no timezone info is parsed.
-        # A more robust solution might involve server settings or user profiles for timezones.
-        if reminder_dt_maybe_aware.tzinfo is None or reminder_dt_maybe_aware.tzinfo.utcoffset(reminder_dt_maybe_aware) is None:
-            # Make it aware, assuming UTC. You might want to adjust this based on your bot's expected userbase.
-            reminder_dt_aware = reminder_dt_maybe_aware.replace(tzinfo=datetime.timezone.utc)
+        reminder_dt_aware = parsed_time.when
+        if parsed_time.assumed_utc:
             logger.warning(f"Reminder time '{reminder_time}' was timezone-naive, assuming UTC. Result: {reminder_dt_aware}")
-        else:
-            # If already aware, convert to UTC for consistent internal handling
-            reminder_dt_aware = reminder_dt_maybe_aware.astimezone(datetime.timezone.utc)
 
         # Calculate delay in seconds
         delay = (reminder_dt_aware - now_aware).total_seconds()
@@ -475,30 +1285,48 @@ async def set_reminder(interaction: discord.Interaction, reminder_time: str, rem
              await interaction.response.send_message("Reminders cannot be set more than a year in the future.", ephemeral=True)
              return
 
-        # --- Task Creation and View Setup ---
-        # Create the coroutine object for the reminder task
-        reminder_coro = _run_reminder_task(delay, interaction.guild, reminder_message, interaction)
-
-        # Create the actual asyncio task
-        reminder_task = asyncio.create_task(reminder_coro)
-
-        # Store the task reference using interaction ID as key
-        active_reminder_tasks[interaction.id] = reminder_task
-        logger.info(f"Created and stored reminder task {reminder_task.get_name()} for interaction {interaction.id}.")
+        recurrence = None
+        if repeat:
+            recurrence = normalize_rule(repeat)
+            try:
+                validate_rule(recurrence, reminder_dt_aware, parsed_time.timezone)
+            except ValueError as e:
+                await interaction.response.send_message(str(e), ephemeral=True)
+                return
+
+        # --- Scheduling and View Setup ---
+        reminder = Reminder(
+            id=interaction.id,
+            guild_id=interaction.guild.id,
+            fire_at=reminder_dt_aware,
+            message=reminder_message,
+            channel_id=interaction.channel_id,
+            recurrence=recurrence,
+            dtstart=reminder_dt_aware if recurrence else None,
+            timezone=parsed_time.timezone,
+            targets=resolve_reminder_targets(interaction.guild),
+            interaction=interaction,
+        )
+        reminder_store.add(reminder)
+        if delay <= REMINDER_LOAD_WINDOW:
+            reminder_scheduler.schedule(reminder) # Otherwise the window loader picks it up later
+        logger.info(f"Stored reminder {reminder.id} for {reminder_dt_aware.isoformat()} ({len(reminder_scheduler)} pending in window).")
 
-        # Create the view, passing the task to it for cancellation
-        view = CancelView(task_to_cancel=reminder_task, interaction_id=interaction.id)
-        # --- End Task Creation ---
+        # Create the view; the button cancels the reminder by ID
+        view = discord.ui.View(timeout=None)
+        view.add_item(CancelReminderButton(reminder.id))
+        # --- End Scheduling ---
 
         # Respond to the user
-        hours, remainder = divmod(delay, 3600)
-        minutes, seconds = divmod(remainder, 60)
-        time_string = f"{int(hours)}h {int(minutes)}m {int(seconds)}s"
+        time_string = format_delay(delay)
         # Format reminder time clearly using UTC
         formatted_time = reminder_dt_aware.strftime('%Y-%m-%d %H:%M:%S %Z') # e.g., 2025-12-25 14:00 UTC
 
         await interaction.response.send_message(
-            f"Reminder set for **{formatted_time}** (in {time_string}). Message: '{reminder_message[:100]}{'...' if len(reminder_message)>100 else ''}'",
+            f"Reminder set for **{formatted_time}** (in {time_string})"
+            + (f", repeating **{describe_recurrence(recurrence)}**" if recurrence else "")
+            + f". Message: '{reminder_message[:100]}{'...' if len(reminder_message)>100 else ''}'"
+            + f"\n{describe_reminder_targets(interaction.guild, reminder.targets)}",
             view=view # Attach the view with the cancel button
         )
 
@@ -512,6 +1340,23 @@ async def set_reminder(interaction: discord.Interaction, reminder_time: str, rem
             # If we already responded (e.g., defer), use followup
             await interaction.followup.send(error_message, ephemeral=True)
 
+@set_reminder.autocomplete('reminder_time')
+async def reminder_time_autocomplete(interaction: discord.Interaction, current: str):
+    """Show what the typed time resolves to (in UTC) before the command is submitted."""
+    if not current.strip():
+        return [app_commands.Choice(name=example, value=example) for example in REMINDER_TIME_EXAMPLES]
+    now = datetime.datetime.now(datetime.timezone.utc)
+    try:
+        parsed = parse_reminder_time(current, now)
+    except (ValueError, OverflowError):
+        return [app_commands.Choice(name=f"Can't parse '{current}'"[:100], value=current[:100])]
+    label = f"{current} → {parsed.when:%Y-%m-%d %H:%M} UTC"
+    delay = (parsed.when - now).total_seconds()
+    label += f" (in {format_delay(delay)})" if delay > 0 else " (in the past)"
+    if parsed.assumed_utc:
+        label += " [no zone, UTC assumed]"
+    return [app_commands.Choice(name=label[:100], value=current[:100])]
+
 @set_reminder.error
 async def set_reminder_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
     if isinstance(error, app_commands.MissingPermissions):
@@ -530,7 +1375,7 @@ if __name__ == "__main__":
         print("Error: DISCORD_TOKEN not found in environment variables/.env file.")
     else:
         try:
-            bot.run(token)
+            bot.run(token, log_handler=None) # Logging is already set up (logsetup.py); keep discord.py off stderr
         except discord.LoginFailure:
             print("Error: Invalid Discord Token. Please check your .env file.")
         except Exception as e:
@@ -0,0 +1,76 @@
+"""Member lookups for running without discord.py's member cache (MEMBER_CACHE=lean).
+
+With the full cache every member of every guild stays in memory and guilds are chunked
+at startup. In lean mode nothing is cached: role audiences are streamed over REST when a
+command needs them, keeping only the members with the targeted roles, and recently used
+members are kept in a bounded LRU.
+"""
+import logging
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MemberLRU:
+    """Bounded least-recently-used cache of members, keyed by (guild id, member id)."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._members: OrderedDict[tuple[int, int], object] = OrderedDict()
+
+    def __len__(self):
+        return len(self._members)
+
+    def get(self, guild_id: int, member_id: int):
+        member = self._members.get((guild_id, member_id))
+        if member is not None:
+            self._members.move_to_end((guild_id, member_id))
+        return member
+
+    def put(self, member):
+        key = (member.guild.id, member.id)
+        self._members[key] = member
+        self._members.move_to_end(key)
+        while len(self._members) > self.maxsize:
+            self._members.popitem(last=False)
+
+    def discard(self, guild_id: int, member_id: int):
+        self._members.pop((guild_id, member_id), None)
+
+    def forget_guild(self, guild_id: int):
+        for key in [key for key in self._members if key[0] == guild_id]:
+            del self._members[key]
+
+
+def role_filter(include: Iterable[int], exclude: Iterable[int] = (), require_all: bool = False,
+                everyone_id: Optional[int] = None) -> Callable[[object], bool]:
+    """Predicate for members with any (or every) role in `include` and none in `exclude`.
+
+    `everyone_id` (the guild id) is dropped from `include`, since @everyone matches everyone;
+    an empty `include` then matches every member.
+    """
+    include, exclude = set(include), set(exclude)
+    include.discard(everyone_id)
+
+    def matches(member) -> bool:
+        member_roles = set(member._roles)
+        if include:
+            matched = include <= member_roles if require_all else not include.isdisjoint(member_roles)
+            if not matched:
+                return False
+        return exclude.isdisjoint(member_roles)
+    return matches
+
+
+async def fetch_role_members(guild, include: Iterable[int], exclude: Iterable[int] = (),
+                             require_all: bool = False) -> list:
+    """Stream the guild's members over REST (pages of 1000), keeping only those matching the roles."""
+    matches = role_filter(include, exclude, require_all, everyone_id=guild.id)
+    members, scanned = [], 0
+    async for member in guild.fetch_members(limit=None):
+        scanned += 1
+        if matches(member):
+            members.append(member)
+    logger.info(f"Fetched {len(members)} matching member(s) out of {scanned} in guild {guild.id}.")
+    return members
@@ -0,0 +1,207 @@
+"""Minimal in-process metrics registry with Prometheus text exposition.
+
+Counters, gauges and histograms keyed by label values. `start_http_server` serves
+`/metrics` in the Prometheus text format using aiohttp (already a discord.py dependency).
+"""
+import bisect
+import logging
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labelnames, labels) -> tuple:
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=()) -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, key)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Gauge:
+    """A settable value, or one read from `function` at scrape time."""
+    type = 'gauge'
+
+    def __init__(self, name, documentation, function: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = ()
+        self._function = function
+        self._value = 0.0
+
+    def set(self, value: float):
+        self._value = value
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    def value(self) -> float:
+        return self._function() if self._function else self._value
+
+    def samples(self):
+        yield self.name, '', self.value()
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_label_key(self.labelnames, labels))
+        return series[-1] if series else 0
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Upper bucket bound containing the q-quantile (None if nothing was observed)."""
+        series = self._series.get(_label_key(self.labelnames, labels))
+        if not series or not series[-1]:
+            return None
+        target = q * series[-1]
+        seen = 0
+        for bound, count in zip(self.buckets, series):
+            seen += count
+            if seen >= target:
+                return bound
+        return math.inf
+
+    def label_sets(self) -> list[dict]:
+        return [dict(zip(self.labelnames, key)) for key in self._series]
+
+    def samples(self):
+        for key, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield (f"{self.name}_bucket",
+                       _format_labels(self.labelnames, key, [f'le="{_format_value(bound)}"']), cumulative)
+            yield f"{self.name}_sum", _format_labels(self.labelnames, key), series[-2]
+            yield f"{self.name}_count", _format_labels(self.labelnames, key), series[-1]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, function=None) -> Gauge:
+        return self._register(Gauge(name, documentation, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# --- The bot's metrics ---
+
+COMMAND_LATENCY = REGISTRY.histogram(
+    'bot_command_duration_seconds', 'Time from interaction creation to command completion.', ['command'])
+GET_GCS_DURATION = REGISTRY.histogram(
+    'bot_get_gcs_duration_seconds', 'Time spent resolving group chat channels.',
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0))
+MESSAGES_SENT = REGISTRY.counter(
+    'bot_messages_total', 'Messages attempted, by kind (dm/channel) and outcome.', ['kind', 'status'])
+RATE_LIMITED = REGISTRY.counter(
+    'bot_rate_limited_total', '429 responses seen by the delivery engine.', ['scope'])
+RETRY_AFTER_SECONDS = REGISTRY.counter(
+    'bot_retry_after_seconds_total', 'Sum of retry_after delays imposed by 429 responses.')
+SCHEDULER_QUEUE_DEPTH = REGISTRY.gauge(
+    'bot_scheduler_queue_depth', 'Reminders held in the in-memory scheduler.')
+REMINDER_LATENESS = REGISTRY.histogram(
+    'bot_reminder_fire_lateness_seconds', 'How long after its scheduled time a reminder was fired.',
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 60.0, 300.0))
+
+
+async def start_http_server(port: int, host: str = '127.0.0.1', registry: Registry = REGISTRY) -> web.AppRunner:
+    """Serve GET /metrics on host:port. Returns the runner so the caller can clean it up."""
+    async def handle_metrics(request):
+        return web.Response(text=registry.render(), content_type='text/plain', charset='utf-8',
+                            headers={'X-Prometheus-Format': '0.0.4'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return runner
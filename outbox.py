@@ -0,0 +1,237 @@
+import datetime
+import logging
+import sqlite3
+from typing import Iterable, NamedTuple, Optional
+
+from delivery import DeliveryResult, FORBIDDEN, SENT
+
+logger = logging.getLogger(__name__)
+
+# Campaign kinds
+DM_CAMPAIGN = 'dm'
+CHANNEL_CAMPAIGN = 'channel'
+
+# Campaign states
+RUNNING = 'running'
+DONE = 'done'
+CANCELLED = 'cancelled'
+
+# Recipient states besides the delivery outcomes in delivery.py
+PENDING = 'pending'
+CLAIMED = 'claimed'  # Taken by a delivery worker (worker.py), until recorded or the lease expires
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind        TEXT    NOT NULL,
+    guild_id    INTEGER,
+    message     TEXT    NOT NULL,
+    source      TEXT,
+    state       TEXT    NOT NULL DEFAULT 'running',
+    created_at  REAL    NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_campaigns_state ON campaigns (state);
+
+CREATE TABLE IF NOT EXISTS outbox (
+    campaign_id  INTEGER NOT NULL REFERENCES campaigns (id) ON DELETE CASCADE,
+    recipient_id INTEGER NOT NULL,
+    content      TEXT,
+    state        TEXT    NOT NULL DEFAULT 'pending',
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    last_error   TEXT,
+    updated_at   REAL,
+    claimed_by   TEXT,
+    claimed_at   REAL,
+    PRIMARY KEY (campaign_id, recipient_id)
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_campaign_state ON outbox (campaign_id, state);
+
+-- Recipients whose DMs were found closed, skipped by new campaigns until expires_at
+CREATE TABLE IF NOT EXISTS unreachable (
+    recipient_id INTEGER PRIMARY KEY,
+    reason       TEXT,
+    expires_at   REAL    NOT NULL
+);
+"""
+
+def _now() -> float:
+    return datetime.datetime.now(datetime.timezone.utc).timestamp()
+
+
+class Campaign:
+    __slots__ = ('id', 'kind', 'guild_id', 'message', 'source', 'state', 'created_at')
+
+    def __init__(self, row: sqlite3.Row):
+        for name in self.__slots__:
+            setattr(self, name, row[name])
+
+
+class QueuedMessage(NamedTuple):
+    campaign_id: int
+    kind: str
+    recipient_id: int
+    content: str
+
+
+class Outbox:
+    """Durable record of fan-outs (SQLite, WAL mode): one row per recipient with state,
+    attempts and last error.
+
+    Each delivery outcome is written as soon as it is known, so a campaign interrupted by
+    a crash or restart resumes with only the recipients that haven't been sent to yet.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # Shared with worker processes, so wait on their write locks instead of failing
+        self._conn = sqlite3.connect(path, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def create_campaign(self, kind: str, guild_id: Optional[int], message: str,
+                        recipients: Iterable[tuple[int, Optional[str]]], source: Optional[str] = None,
+                        skipped: Iterable[tuple[int, str]] = ()) -> int:
+        """Record a campaign and its recipients ((recipient_id, content or None)) in one transaction.
+
+        `skipped` recipients ((recipient_id, state), e.g. bots) are recorded as already settled
+        in that state, so they show up in the counts without being sent to.
+        """
+        with self._conn:
+            self._conn.execute("BEGIN")
+            cur = self._conn.execute(
+                "INSERT INTO campaigns (kind, guild_id, message, source, state, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, guild_id, message, source, RUNNING, _now()),
+            )
+            campaign_id = cur.lastrowid
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO outbox (campaign_id, recipient_id, content) VALUES (?, ?, ?)",
+                ((campaign_id, recipient_id, content) for recipient_id, content in recipients),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO outbox (campaign_id, recipient_id, state) VALUES (?, ?, ?)",
+                ((campaign_id, recipient_id, state) for recipient_id, state in skipped),
+            )
+        return campaign_id
+
+    def get(self, campaign_id: int) -> Optional[Campaign]:
+        row = self._conn.execute("SELECT * FROM campaigns WHERE id = ?", (campaign_id,)).fetchone()
+        return Campaign(row) if row else None
+
+    def holds_claim(self, worker: str, campaign_id: int, recipient_id: int) -> bool:
+        """Whether `worker` still holds its claim on a message of a running campaign.
+
+        False once the campaign was cancelled, or once the claim's lease expired and the
+        message was released (and possibly claimed by another worker).
+        """
+        row = self._conn.execute(
+            "SELECT 1 FROM outbox o JOIN campaigns c ON c.id = o.campaign_id "
+            "WHERE o.campaign_id = ? AND o.recipient_id = ? AND o.state = ? AND o.claimed_by = ? AND c.state = ?",
+            (campaign_id, recipient_id, CLAIMED, worker, RUNNING),
+        ).fetchone()
+        return row is not None
+
+    def running(self) -> list[Campaign]:
+        return [Campaign(row) for row in self._conn.execute(
+            "SELECT * FROM campaigns WHERE state = ? ORDER BY id", (RUNNING,))]
+
+    def pending(self, campaign_id: int) -> list[tuple[int, Optional[str]]]:
+        """(recipient_id, content) still to be delivered."""
+        return [(row['recipient_id'], row['content']) for row in self._conn.execute(
+            "SELECT recipient_id, content FROM outbox WHERE campaign_id = ? AND state = ?", (campaign_id, PENDING))]
+
+    def record(self, campaign_id: int, result: DeliveryResult, worker: Optional[str] = None):
+        """Store a delivery outcome. With `worker`, only if that worker still holds the message's claim."""
+        query = ("UPDATE outbox SET state = ?, attempts = attempts + ?, last_error = ?, updated_at = ? "
+                 "WHERE campaign_id = ? AND recipient_id = ?")
+        params = (result.status, result.attempts, result.error, _now(), campaign_id, result.recipient_id)
+        if worker is not None:
+            query += " AND state = ? AND claimed_by = ?"
+            params += (CLAIMED, worker)
+        self._conn.execute(query, params)
+
+    def claim(self, worker: str, limit: int) -> list[QueuedMessage]:
+        """Atomically take up to `limit` pending messages of running campaigns for `worker`."""
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            rows = self._conn.execute(
+                "SELECT o.campaign_id, c.kind, o.recipient_id, COALESCE(o.content, c.message) AS content "
+                "FROM outbox o JOIN campaigns c ON c.id = o.campaign_id "
+                "WHERE c.state = ? AND o.state = ? ORDER BY o.campaign_id LIMIT ?",
+                (RUNNING, PENDING, limit),
+            ).fetchall()
+            now = _now()
+            self._conn.executemany(
+                "UPDATE outbox SET state = ?, claimed_by = ?, claimed_at = ? WHERE campaign_id = ? AND recipient_id = ?",
+                ((CLAIMED, worker, now, row['campaign_id'], row['recipient_id']) for row in rows),
+            )
+        return [QueuedMessage(*row) for row in rows]
+
+    def release(self, worker: Optional[str] = None, older_than: Optional[datetime.timedelta] = None) -> int:
+        """Put claimed messages back to pending: those of `worker`, and/or those claimed longer ago than `older_than`."""
+        conditions, params = [], []
+        if worker is not None:
+            conditions.append("claimed_by = ?")
+            params.append(worker)
+        if older_than is not None:
+            conditions.append("claimed_at < ?")
+            params.append(_now() - older_than.total_seconds())
+        where = " OR ".join(conditions) or "1"
+        cur = self._conn.execute(
+            f"UPDATE outbox SET state = ?, claimed_by = NULL, claimed_at = NULL WHERE state = ? AND ({where})",
+            (PENDING, CLAIMED, *params),
+        )
+        return cur.rowcount
+
+    def finish_completed(self) -> int:
+        """Mark running campaigns with nothing left to send as done. Returns how many were finished."""
+        cur = self._conn.execute(
+            "UPDATE campaigns SET state = ?, finished_at = ? WHERE state = ? AND NOT EXISTS ("
+            "SELECT 1 FROM outbox WHERE outbox.campaign_id = campaigns.id AND outbox.state IN (?, ?))",
+            (DONE, _now(), RUNNING, PENDING, CLAIMED),
+        )
+        return cur.rowcount
+
+    def unreachable(self) -> set[int]:
+        """Recipients whose DMs are currently known to be closed."""
+        return {row[0] for row in self._conn.execute(
+            "SELECT recipient_id FROM unreachable WHERE expires_at > ?", (_now(),))}
+
+    def note_reachability(self, result: DeliveryResult, ttl: datetime.timedelta):
+        """Remember a DM recipient that refused the message for `ttl`; forget it once a DM gets through."""
+        if result.status == FORBIDDEN:
+            self._conn.execute(
+                "INSERT INTO unreachable (recipient_id, reason, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (recipient_id) DO UPDATE SET reason = excluded.reason, expires_at = excluded.expires_at",
+                (result.recipient_id, result.error, _now() + ttl.total_seconds()),
+            )
+        elif result.status == SENT:
+            self._conn.execute("DELETE FROM unreachable WHERE recipient_id = ?", (result.recipient_id,))
+
+    def counts(self, campaign_id: int) -> dict[str, int]:
+        return {row['state']: row['n'] for row in self._conn.execute(
+            "SELECT state, COUNT(*) AS n FROM outbox WHERE campaign_id = ? GROUP BY state", (campaign_id,))}
+
+    def finish(self, campaign_id: int, state: str = DONE) -> bool:
+        """Move a running campaign to `state`. Returns False if it wasn't running."""
+        cur = self._conn.execute(
+            "UPDATE campaigns SET state = ?, finished_at = ? WHERE id = ? AND state = ?",
+            (state, _now(), campaign_id, RUNNING),
+        )
+        return cur.rowcount > 0
+
+    def prune(self, older_than: datetime.timedelta) -> int:
+        """Delete finished campaigns (and their rows) older than `older_than`, and expired unreachable entries."""
+        now = _now()
+        self._conn.execute("DELETE FROM unreachable WHERE expires_at <= ?", (now,))
+        cur = self._conn.execute(
+            "DELETE FROM campaigns WHERE state != ? AND finished_at < ?",
+            (RUNNING, now - older_than.total_seconds()),
+        )
+        return cur.rowcount
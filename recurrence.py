@@ -0,0 +1,66 @@
+import datetime
+from typing import Optional
+
+import dateutil.rrule
+import dateutil.tz
+
+# Shorthands accepted by /set_reminder's `repeat` option
+PRESETS = {
+    'hourly': 'FREQ=HOURLY',
+    'daily': 'FREQ=DAILY',
+    'weekdays': 'FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR',
+    'weekly': 'FREQ=WEEKLY',
+    'biweekly': 'FREQ=WEEKLY;INTERVAL=2',
+    'monthly': 'FREQ=MONTHLY',
+}
+
+# Reject rules that would fire more often than this
+MIN_INTERVAL = datetime.timedelta(minutes=15)
+
+
+def normalize_rule(text: str) -> str:
+    """Turn a preset name or an RRULE string ('FREQ=WEEKLY;BYDAY=MO') into a normalized RRULE."""
+    text = text.strip()
+    preset = PRESETS.get(text.lower())
+    if preset:
+        return preset
+    if text.upper().startswith('RRULE:'):
+        text = text[len('RRULE:'):]
+    return text.upper()
+
+
+def build_rule(rule: str, dtstart: datetime.datetime, timezone: Optional[str] = None) -> dateutil.rrule.rrule:
+    """rrule anchored at dtstart, iterating in `timezone` wall-clock time (so DST doesn't shift it)."""
+    tz = dateutil.tz.gettz(timezone) if timezone else None
+    anchor = dtstart.astimezone(tz) if tz else dtstart
+    return dateutil.rrule.rrulestr(rule, dtstart=anchor)
+
+
+def validate_rule(rule: str, dtstart: datetime.datetime, timezone: Optional[str] = None):
+    """Raise ValueError if the rule can't be parsed or fires more often than MIN_INTERVAL."""
+    try:
+        parsed = build_rule(rule, dtstart, timezone)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid recurrence rule '{rule}': {e}") from e
+    first = parsed.after(dtstart, inc=True)
+    second = parsed.after(first) if first else None
+    if first and second and second - first < MIN_INTERVAL:
+        raise ValueError(f"Recurring reminders can't repeat more often than every {int(MIN_INTERVAL.total_seconds() // 60)} minutes.")
+
+
+def next_occurrence(rule: str, dtstart: datetime.datetime, after: datetime.datetime,
+                    timezone: Optional[str] = None) -> Optional[datetime.datetime]:
+    """First occurrence strictly after `after`, in UTC, or None when the rule is exhausted.
+
+    Always computed from the rule and its absolute anchor, never by adding intervals to
+    the previous fire time, so long-running series don't drift.
+    """
+    occurrence = build_rule(rule, dtstart, timezone).after(after)
+    return occurrence.astimezone(datetime.timezone.utc) if occurrence else None
+
+
+def describe(rule: str) -> str:
+    for name, preset in PRESETS.items():
+        if preset == rule:
+            return name
+    return rule
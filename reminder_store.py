@@ -0,0 +1,117 @@
+import datetime
+import json
+import logging
+import sqlite3
+from typing import Optional
+
+from scheduler import Reminder
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+FIRED = 'fired'
+CANCELLED = 'cancelled'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reminders (
+    id          INTEGER PRIMARY KEY,
+    guild_id    INTEGER NOT NULL,
+    channel_id  INTEGER,
+    fire_at     REAL    NOT NULL,
+    message     TEXT    NOT NULL,
+    state       TEXT    NOT NULL DEFAULT 'pending',
+    created_at  REAL    NOT NULL,
+    recurrence  TEXT,
+    dtstart     REAL,
+    timezone    TEXT,
+    targets     TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_reminders_state_fire_at ON reminders (state, fire_at);
+"""
+
+def _to_ts(dt: datetime.datetime) -> float:
+    return dt.timestamp()
+
+
+def _from_ts(ts: float) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(ts, tz=datetime.timezone.utc)
+
+
+def _dump_targets(targets: Optional[list[tuple[int, Optional[int]]]]) -> Optional[str]:
+    return json.dumps(targets) if targets is not None else None
+
+
+def _load_targets(value: Optional[str]) -> Optional[list[tuple[int, Optional[int]]]]:
+    return [tuple(target) for target in json.loads(value)] if value is not None else None
+
+
+class ReminderStore:
+    """Durable SQLite (WAL mode) store for reminders, indexed by state and fire time.
+
+    Only the due and near-due window is loaded into the scheduler; the rest stays on
+    disk until the window reaches it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, isolation_level=None)  # autocommit; one statement per write
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def _row_to_reminder(self, row: sqlite3.Row) -> Reminder:
+        return Reminder(
+            id=row['id'],
+            guild_id=row['guild_id'],
+            fire_at=_from_ts(row['fire_at']),
+            message=row['message'],
+            channel_id=row['channel_id'],
+            recurrence=row['recurrence'],
+            dtstart=_from_ts(row['dtstart']) if row['dtstart'] is not None else None,
+            timezone=row['timezone'],
+            targets=_load_targets(row['targets']),
+        )
+
+    def add(self, reminder: Reminder):
+        self._conn.execute(
+            "INSERT INTO reminders (id, guild_id, channel_id, fire_at, message, state, created_at, "
+            "recurrence, dtstart, timezone, targets) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (reminder.id, reminder.guild_id, reminder.channel_id,
+             _to_ts(reminder.fire_at), reminder.message, PENDING,
+             datetime.datetime.now(datetime.timezone.utc).timestamp(),
+             reminder.recurrence, _to_ts(reminder.dtstart) if reminder.dtstart else None, reminder.timezone,
+             _dump_targets(reminder.targets)),
+        )
+
+    def set_targets(self, reminder_id: int, targets: list[tuple[int, Optional[int]]]):
+        self._conn.execute("UPDATE reminders SET targets = ? WHERE id = ?", (_dump_targets(targets), reminder_id))
+
+    def mark(self, reminder_id: int, state: str, expected: str = PENDING) -> bool:
+        """Move a reminder from `expected` to `state`. Returns False if it was not in `expected`."""
+        cur = self._conn.execute(
+            "UPDATE reminders SET state = ? WHERE id = ? AND state = ?", (state, reminder_id, expected)
+        )
+        return cur.rowcount == 1
+
+    def advance(self, reminder_id: int, fire_at: datetime.datetime) -> bool:
+        """Move a pending recurring reminder to its next occurrence. Returns False if it is no longer pending."""
+        cur = self._conn.execute(
+            "UPDATE reminders SET fire_at = ? WHERE id = ? AND state = ?", (_to_ts(fire_at), reminder_id, PENDING)
+        )
+        return cur.rowcount == 1
+
+    def get(self, reminder_id: int) -> Optional[Reminder]:
+        row = self._conn.execute("SELECT * FROM reminders WHERE id = ?", (reminder_id,)).fetchone()
+        return self._row_to_reminder(row) if row else None
+
+    def due_before(self, until: datetime.datetime) -> list[Reminder]:
+        """Pending reminders firing before `until` (including overdue ones), ordered by fire time."""
+        rows = self._conn.execute(
+            "SELECT * FROM reminders WHERE state = ? AND fire_at < ? ORDER BY fire_at",
+            (PENDING, _to_ts(until)),
+        ).fetchall()
+        return [self._row_to_reminder(row) for row in rows]
@@ -0,0 +1,206 @@
+import asyncio
+import datetime
+import heapq
+import itertools
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+from metrics import REMINDER_LATENESS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Reminder:
+    """A single pending reminder."""
+    id: int
+    guild_id: int
+    fire_at: datetime.datetime  # timezone-aware, UTC
+    message: str
+    channel_id: Optional[int] = None  # Channel the reminder was set from (for confirmations)
+    recurrence: Optional[str] = None  # RRULE for recurring reminders (see recurrence.py)
+    dtstart: Optional[datetime.datetime] = None  # Anchor of the recurrence rule
+    timezone: Optional[str] = None  # Zone the rule's wall-clock times are in (None = UTC)
+    # Group chat channel ids and the role id each mentions, resolved when the reminder was set
+    targets: Optional[list[tuple[int, Optional[int]]]] = None
+    # Interaction that created the reminder, used for followups (not persisted)
+    interaction: Any = field(default=None, repr=False, compare=False)
+    # Payloads built by the scheduler's prepare callback shortly before it fires (not persisted)
+    prepared: Any = field(default=None, repr=False, compare=False)
+
+
+class ReminderScheduler:
+    """Keeps pending reminders in a min-heap keyed by fire time.
+
+    A single dispatcher task sleeps until the earliest reminder is due, instead of
+    one sleeping task per reminder. Cancelling is done by reminder ID: the entry is
+    dropped from the lookup table and its heap slot is skipped lazily when it
+    reaches the top (the heap is compacted once stale slots outnumber live ones).
+
+    Reminders due within `coalesce_window` seconds of each other are fired together:
+    when one comes due, every reminder due up to `coalesce_window` seconds after it is
+    taken along (firing at most that much early), and the callback receives them as one
+    list per guild.
+
+    With a `prepare_callback`, the dispatcher wakes up `prepare_lead` seconds before a
+    reminder is due and calls it (synchronously, once per guild) with the reminders that
+    will fire together, so the work of building their messages is done ahead of time.
+    """
+
+    def __init__(self, fire_callback: Callable[[list[Reminder]], Awaitable[None]], coalesce_window: float = 0.0,
+                 prepare_callback: Optional[Callable[[list[Reminder]], None]] = None, prepare_lead: float = 0.0):
+        self._fire_callback = fire_callback
+        self.coalesce_window = coalesce_window
+        self._prepare_callback = prepare_callback
+        self.prepare_lead = prepare_lead if prepare_callback else 0.0
+        self._prepared: set[int] = set()  # Ids already passed to the prepare callback
+        self._heap: list[tuple[float, int, int]] = []  # (fire timestamp, seq, reminder id)
+        self._reminders: dict[int, Reminder] = {}
+        self._seq = itertools.count()
+        self._stale = 0
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._running: set[asyncio.Task] = set()
+
+    def __len__(self):
+        return len(self._reminders)
+
+    def __contains__(self, reminder_id: int):
+        return reminder_id in self._reminders
+
+    def get(self, reminder_id: int) -> Optional[Reminder]:
+        return self._reminders.get(reminder_id)
+
+    def pending(self, guild_id: Optional[int] = None) -> list[Reminder]:
+        """Pending reminders ordered by fire time, optionally for one guild."""
+        reminders = (r for r in self._reminders.values() if guild_id is None or r.guild_id == guild_id)
+        return sorted(reminders, key=lambda r: r.fire_at)
+
+    def start(self):
+        """Start the dispatcher loop (no-op if already running)."""
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch_loop(), name="reminder_dispatcher")
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+
+    def schedule(self, reminder: Reminder):
+        """Add a reminder. O(log n)."""
+        if reminder.id in self._reminders:
+            raise ValueError(f"Reminder {reminder.id} is already scheduled")
+        self._reminders[reminder.id] = reminder
+        heapq.heappush(self._heap, (reminder.fire_at.timestamp(), next(self._seq), reminder.id))
+        # Only wake the dispatcher if the new reminder is now the earliest one
+        if self._heap[0][2] == reminder.id:
+            self._wakeup.set()
+
+    def cancel(self, reminder_id: int) -> Optional[Reminder]:
+        """Cancel a pending reminder by ID. Returns the reminder, or None if it is not pending."""
+        reminder = self._reminders.pop(reminder_id, None)
+        if reminder is None:
+            return None
+        self._prepared.discard(reminder_id)
+        self._stale += 1
+        if self._stale > len(self._reminders):
+            self._compact()
+        return reminder
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if entry[2] in self._reminders]
+        heapq.heapify(self._heap)
+        self._stale = 0
+
+    def _pop_stale(self):
+        while self._heap and self._heap[0][2] not in self._reminders:
+            heapq.heappop(self._heap)
+            self._stale = max(0, self._stale - 1)
+
+    async def _dispatch_loop(self):
+        while True:
+            self._pop_stale()
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            fire_ts, _, reminder_id = self._heap[0]
+            delay = fire_ts - datetime.datetime.now(datetime.timezone.utc).timestamp()
+            unprepared = self._prepare_callback is not None and reminder_id not in self._prepared
+            if unprepared and delay <= self.prepare_lead:
+                self._prepare(fire_ts + self.coalesce_window)
+                continue
+            if delay > 0:
+                timeout = delay - self.prepare_lead if unprepared else delay
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            REMINDER_LATENESS.observe(-delay)
+            by_guild: dict[int, list[Reminder]] = {}
+            reminder = self._reminders.pop(reminder_id)
+            self._prepared.discard(reminder_id)
+            by_guild[reminder.guild_id] = [reminder]
+            # Take along everything else due within the coalescing window
+            limit = fire_ts + self.coalesce_window
+            while True:
+                self._pop_stale()
+                if not self._heap or self._heap[0][0] > limit:
+                    break
+                _, _, other_id = heapq.heappop(self._heap)
+                other = self._reminders.pop(other_id)
+                self._prepared.discard(other_id)
+                by_guild.setdefault(other.guild_id, []).append(other)
+
+            for reminders in by_guild.values():
+                task = asyncio.create_task(self._fire(reminders), name=f"reminder_{reminders[0].id}")
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+    def _due_by(self, limit: float):
+        """Heap entries with fire timestamp <= `limit`, in order. O(k log k) for k such entries.
+
+        Walks the heap as a tree from the root: a node's children are never earlier than it,
+        so the walk stops at every node past `limit` and never visits the rest of the heap.
+        """
+        heap = self._heap
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier:
+            entry, index = heapq.heappop(frontier)
+            if entry[0] > limit:
+                break  # Everything left in the frontier is at least as late
+            yield entry
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(heap) and heap[child][0] <= limit:
+                    heapq.heappush(frontier, (heap[child], child))
+
+    def _prepare(self, limit: float):
+        """Pass the not yet prepared reminders due by `limit` to the prepare callback, per guild."""
+        by_guild: dict[int, list[Reminder]] = {}
+        for fire_ts, _, reminder_id in self._due_by(limit):
+            if reminder_id in self._reminders and reminder_id not in self._prepared:
+                self._prepared.add(reminder_id)
+                reminder = self._reminders[reminder_id]
+                by_guild.setdefault(reminder.guild_id, []).append(reminder)
+        for reminders in by_guild.values():
+            try:
+                self._prepare_callback(reminders)
+            except Exception as e:
+                ids = ', '.join(str(reminder.id) for reminder in reminders)
+                logger.error(f"Reminder(s) {ids}: error while preparing: {e}", exc_info=True)
+
+    async def _fire(self, reminders: list[Reminder]):
+        try:
+            await self._fire_callback(reminders)
+        except Exception as e:
+            ids = ', '.join(str(reminder.id) for reminder in reminders)
+            logger.error(f"Reminder(s) {ids}: error while firing: {e}", exc_info=True)
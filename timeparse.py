@@ -0,0 +1,175 @@
+"""Parsing of /set_reminder times: relative durations, day keywords and named zones.
+
+Handled directly with precompiled patterns:
+    "in 2 hours", "in 1h30m", "90 minutes", "in 1 week and 2 days"
+    "tomorrow 10am EST", "today at 17:30 Europe/Berlin", "friday 9pm PST"
+Anything else ("2025-12-25 09:00 PST", "Dec 25 9am") goes to dateutil.parser, with zone
+abbreviations resolved through ZONE_ABBREVIATIONS instead of being silently dropped.
+
+Parsing is split in two: the text is turned into a "spec" that doesn't depend on the
+current time (cached per normalized input), and the spec is resolved against `now`.
+dateutil fills whatever the text leaves out (year, month, weekday...) from a default
+date, so that fallback is only run at resolve time, with `now` as the default.
+"""
+import datetime
+import functools
+import re
+import zoneinfo
+from typing import NamedTuple, Optional
+
+import dateutil.parser
+import dateutil.tz
+
+# Abbreviations map to the IANA zone people mean, so "EST" in July is still Eastern time
+ZONE_ABBREVIATIONS = {
+    'utc': 'UTC', 'gmt': 'UTC', 'z': 'UTC',
+    'est': 'America/New_York', 'edt': 'America/New_York', 'et': 'America/New_York',
+    'cst': 'America/Chicago', 'cdt': 'America/Chicago', 'ct': 'America/Chicago',
+    'mst': 'America/Denver', 'mdt': 'America/Denver', 'mt': 'America/Denver',
+    'pst': 'America/Los_Angeles', 'pdt': 'America/Los_Angeles', 'pt': 'America/Los_Angeles',
+    'akst': 'America/Anchorage', 'akdt': 'America/Anchorage',
+    'hst': 'Pacific/Honolulu',
+    'bst': 'Europe/London', 'wet': 'Europe/Lisbon', 'west': 'Europe/Lisbon',
+    'cet': 'Europe/Paris', 'cest': 'Europe/Paris',
+    'eet': 'Europe/Athens', 'eest': 'Europe/Athens',
+    'msk': 'Europe/Moscow',
+    'ist': 'Asia/Kolkata',
+    'sgt': 'Asia/Singapore', 'hkt': 'Asia/Hong_Kong',
+    'jst': 'Asia/Tokyo', 'kst': 'Asia/Seoul',
+    'aest': 'Australia/Sydney', 'aedt': 'Australia/Sydney',
+    'awst': 'Australia/Perth',
+    'nzst': 'Pacific/Auckland', 'nzdt': 'Pacific/Auckland',
+}
+
+_UNIT_SECONDS = {
+    'w': 7 * 24 * 3600, 'week': 7 * 24 * 3600, 'weeks': 7 * 24 * 3600,
+    'd': 24 * 3600, 'day': 24 * 3600, 'days': 24 * 3600,
+    'h': 3600, 'hr': 3600, 'hrs': 3600, 'hour': 3600, 'hours': 3600,
+    'm': 60, 'min': 60, 'mins': 60, 'minute': 60, 'minutes': 60,
+    's': 1, 'sec': 1, 'secs': 1, 'second': 1, 'seconds': 1,
+}
+_WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+_UNITS = '|'.join(sorted(_UNIT_SECONDS, key=len, reverse=True))  # Longest first: "hours" before "h"
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)\s*(' + _UNITS + r')(?![a-z])')
+_RELATIVE = re.compile(
+    r'^(?:in\s+)?(?P<parts>\d+(?:\.\d+)?\s*(?:' + _UNITS + r')'
+    r'(?:(?:\s*,\s*|\s+and\s+|\s*)\d+(?:\.\d+)?\s*(?:' + _UNITS + r'))*)(?:\s+from\s+now)?$'
+)
+_DAY_TIME = re.compile(
+    r'^(?P<day>today|tomorrow|' + '|'.join(_WEEKDAYS) + r')?\s*(?:at\s+)?'
+    r'(?:(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<ampm>am|pm)?)?$'
+)
+
+
+class ParsedTime(NamedTuple):
+    when: datetime.datetime  # timezone-aware, UTC
+    timezone: Optional[str]  # IANA zone the time was given in, if any
+    assumed_utc: bool  # True when no zone was given and UTC was assumed
+
+
+@functools.lru_cache(maxsize=1)
+def _iana_zones() -> dict[str, str]:
+    return {name.lower(): name for name in zoneinfo.available_timezones()}
+
+
+def resolve_zone(token: str) -> Optional[str]:
+    """IANA zone name for an abbreviation ('est') or zone name ('europe/berlin'), else None."""
+    token = token.lower()
+    return ZONE_ABBREVIATIONS.get(token) or _iana_zones().get(token)
+
+
+def _normalize(text: str) -> str:
+    return ' '.join(text.lower().split())
+
+
+def _split_zone(text: str) -> tuple[str, Optional[str]]:
+    """Strip a trailing zone token, if there is one."""
+    head, _, last = text.rpartition(' ')
+    if head:
+        zone = resolve_zone(last)
+        if zone:
+            return head, zone
+    return text, None
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_spec(normalized: str) -> tuple:
+    """Parse normalized text into a spec that is independent of the current time."""
+    relative = _RELATIVE.match(normalized)
+    if relative:
+        seconds = sum(float(amount) * _UNIT_SECONDS[unit] for amount, unit in _DURATION_PART.findall(relative.group('parts')))
+        return ('relative', datetime.timedelta(seconds=seconds))
+
+    text, zone = _split_zone(normalized)
+    day_time = _DAY_TIME.match(text)
+    if day_time and (day_time.group('day') or day_time.group('ampm') or day_time.group('minute')):
+        hour = day_time.group('hour')
+        if hour is not None:
+            hour = int(hour)
+            if day_time.group('ampm'):
+                if not 1 <= hour <= 12:
+                    raise ValueError(f"Invalid hour '{hour}{day_time.group('ampm')}'")
+                hour = hour % 12 + (12 if day_time.group('ampm') == 'pm' else 0)
+            minute = int(day_time.group('minute') or 0)
+            datetime.time(hour, minute)  # Validates the range
+            clock = (hour, minute)
+        else:
+            clock = None  # "tomorrow" alone: same time of day
+        return ('day_time', day_time.group('day') or 'today', clock, zone)
+
+    # Fall back to dateutil for absolute dates (parsed in _resolve); the zone (if any) was stripped above
+    return ('absolute', text, zone)
+
+
+def _resolve(spec: tuple, now: datetime.datetime) -> ParsedTime:
+    kind = spec[0]
+    if kind == 'relative':
+        return ParsedTime(now + spec[1], None, False)
+
+    if kind == 'day_time':
+        _, day, clock, zone = spec
+        tz = dateutil.tz.gettz(zone) if zone else datetime.timezone.utc
+        local_now = now.astimezone(tz)
+        hour, minute = clock if clock else (local_now.hour, local_now.minute)
+        if day == 'today':
+            offset = 0
+        elif day == 'tomorrow':
+            offset = 1
+        else:
+            offset = (_WEEKDAYS.index(day) - local_now.weekday()) % 7
+        date = local_now.date() + datetime.timedelta(days=offset)
+        when = datetime.datetime.combine(date, datetime.time(hour, minute), tzinfo=tz)
+        if day in _WEEKDAYS and when <= now:
+            when += datetime.timedelta(days=7)  # "friday 9am" on a Friday afternoon means next week
+        return ParsedTime(when.astimezone(datetime.timezone.utc), zone, zone is None)
+
+    _, text, zone = spec
+    # Missing fields come from today in the given zone (midnight if no time is given)
+    local_now = now.astimezone(dateutil.tz.gettz(zone) if zone else datetime.timezone.utc)
+    default = local_now.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    try:
+        parsed = dateutil.parser.parse(text, default=default)
+    except (ValueError, OverflowError) as e:
+        raise ValueError(f"Could not understand time '{text}'") from e
+    if parsed.tzinfo is not None:
+        return ParsedTime(parsed.astimezone(datetime.timezone.utc), None, False)
+    if zone:
+        return ParsedTime(parsed.replace(tzinfo=dateutil.tz.gettz(zone)).astimezone(datetime.timezone.utc), zone, False)
+    return ParsedTime(parsed.replace(tzinfo=datetime.timezone.utc), None, True)
+
+
+def parse_reminder_time(text: str, now: Optional[datetime.datetime] = None) -> ParsedTime:
+    """Parse a reminder time. Raises ValueError if it can't be understood."""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    normalized = _normalize(text)
+    if not normalized:
+        raise ValueError("No time given")
+    return _resolve(_parse_spec(normalized), now)
+
+
+def format_delay(seconds: float) -> str:
+    days, remainder = divmod(int(seconds), 86400)
+    hours, remainder = divmod(remainder, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return (f"{days}d " if days else "") + f"{hours}h {minutes}m {seconds}s"
@@ -0,0 +1,173 @@
+"""Delivery worker: sends queued DMs and reminder posts from the outbox, off the bot's event loop.
+
+Run the bot with DELIVERY_MODE=queue and start one or more workers next to it, on the
+same OUTBOX_DB_PATH:
+    python worker.py
+    python worker.py --processes 4
+
+The bot process then only records campaigns; workers claim batches of messages from the
+outbox and send them over REST with their own HTTP-only clients (no gateway connection).
+Claims are leased: messages claimed by a worker that died are handed out again once the
+lease expires. A worker checks it still holds a message's claim before sending it, so a
+batch that outlives its lease doesn't resend what another worker has taken over. Rate limits are per bot token, so the global and per-kind rates are split
+evenly across --processes; lower them when running several worker.py commands at once.
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+
+import discord
+from dotenv import load_dotenv
+
+import outbox
+from delivery import DISCORD_GLOBAL_RATE, DeliveryEngine, TokenBucket
+from logsetup import setup_logging
+from outbox import Outbox
+
+logger = logging.getLogger('worker')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=1, help="Worker processes to run (default: 1)")
+    parser.add_argument('--batch', type=int, default=100, help="Messages claimed per batch (default: 100)")
+    parser.add_argument('--poll', type=float, default=1.0, help="Seconds between polls of an empty queue (default: 1)")
+    parser.add_argument('--lease', type=float, default=300.0,
+                        help="Seconds before another worker may take over an unfinished claim (default: 300)")
+    parser.add_argument('--global-rate', type=float, default=DISCORD_GLOBAL_RATE,
+                        help=f"Requests per second for the bot token, across all processes (default: {DISCORD_GLOBAL_RATE})")
+    parser.add_argument('--dm-rate', type=float, default=float(os.getenv('DM_RATE_PER_SECOND', '5')),
+                        help="DMs per second, across all processes (default: DM_RATE_PER_SECOND or 5)")
+    parser.add_argument('--channel-rate', type=float, default=float(os.getenv('CHANNEL_RATE_PER_SECOND', '20')),
+                        help="Channel posts per second, across all processes (default: CHANNEL_RATE_PER_SECOND or 20)")
+    parser.add_argument('--dm-closed-ttl-days', type=float, default=float(os.getenv('DM_CLOSED_TTL_DAYS', '7')),
+                        help="Days to skip a recipient whose DMs were closed (default: DM_CLOSED_TTL_DAYS or 7)")
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv('DM_CONCURRENCY', '8')),
+                        help="Sends in flight per process and kind (default: DM_CONCURRENCY or 8)")
+    return parser.parse_args(argv)
+
+
+class Worker:
+    def __init__(self, client: discord.Client, store: Outbox, name: str, args, share: float):
+        self.client = client
+        self.outbox = store
+        self.name = name
+        self.batch = args.batch
+        self.poll = args.poll
+        self.lease = datetime.timedelta(seconds=args.lease)
+        self.unreachable_ttl = datetime.timedelta(days=args.dm_closed_ttl_days)
+        global_bucket = TokenBucket(args.global_rate * share)
+        self.dm_engine = DeliveryEngine(rate=args.dm_rate * share, concurrency=args.concurrency,
+                                        global_bucket=global_bucket)
+        self.channel_engine = DeliveryEngine(rate=args.channel_rate * share, concurrency=args.concurrency,
+                                             global_bucket=global_bucket)
+
+    async def send_dm(self, item: outbox.QueuedMessage):
+        if not self.outbox.holds_claim(self.name, item.campaign_id, item.recipient_id):
+            # Cancelled since the batch was claimed (released after the batch), or the lease ran
+            # out and another worker may have taken the message over
+            return None
+        async def send():
+            # Opening the DM channel is a request of its own (this client caches few DM channels)
+            await self.dm_engine.acquire_global()
+            channel = await self.client.create_dm(discord.Object(item.recipient_id))
+            await channel.send(item.content)
+        result = await self.dm_engine.send_one(item.recipient_id, send)
+        self.outbox.record(item.campaign_id, result, worker=self.name)
+        self.outbox.note_reachability(result, self.unreachable_ttl)
+        return result
+
+    async def send_to_channel(self, item: outbox.QueuedMessage):
+        if not self.outbox.holds_claim(self.name, item.campaign_id, item.recipient_id):
+            return None
+        channel = self.client.get_partial_messageable(item.recipient_id)
+        result = await self.channel_engine.send_one(item.recipient_id, lambda: channel.send(item.content))
+        self.outbox.record(item.campaign_id, result, worker=self.name)
+        return result
+
+    async def run_batch(self, items: list[outbox.QueuedMessage]):
+        dms = [item for item in items if item.kind == outbox.DM_CAMPAIGN]
+        posts = [item for item in items if item.kind != outbox.DM_CAMPAIGN]
+        await asyncio.gather(self.dm_engine.deliver(dms, self.send_dm),
+                             self.channel_engine.deliver(posts, self.send_to_channel))
+
+    async def run(self):
+        logger.info(f"Worker {self.name} started.")
+        while True:
+            released = self.outbox.release(older_than=self.lease)
+            if released:
+                logger.warning(f"Took back {released} message(s) whose claim expired.")
+            items = self.outbox.claim(self.name, self.batch)
+            if items:
+                await self.run_batch(items)
+                self.outbox.release(worker=self.name)  # Messages of campaigns cancelled mid-batch
+                logger.info(f"Worker {self.name}: delivered a batch of {len(items)} message(s).")
+            finished = self.outbox.finish_completed()
+            if finished:
+                logger.info(f"Worker {self.name}: {finished} campaign(s) completed.")
+            if len(items) < self.batch:
+                await asyncio.sleep(self.poll)
+
+
+async def serve(args, token, share):
+    store = Outbox(os.getenv('OUTBOX_DB_PATH', 'outbox.db'))
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    # REST only: no gateway connection and nothing cached
+    client = discord.Client(intents=discord.Intents.none(), member_cache_flags=discord.MemberCacheFlags.none())
+    try:
+        async with client:
+            await client.login(token)
+            await Worker(client, store, name, args, share).run()
+    finally:
+        store.release(worker=name)  # Hand unfinished claims back straight away
+        store.close()
+
+
+def run_process(args, token, share):
+    setup_logging(logging.INFO, 'json' if os.getenv('LOG_FORMAT') == 'json' else 'text')
+    try:
+        asyncio.run(serve(args, token, share))
+    except discord.LoginFailure:
+        print("Error: Invalid Discord Token. Please check your .env file.", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def _process_main(args, token, share):
+    sys.exit(run_process(args, token, share))
+
+
+def main(argv=None):
+    load_dotenv()
+    args = parse_args(argv)
+    token = os.getenv('DISCORD_TOKEN')
+    if not token:
+        print("Error: DISCORD_TOKEN not found in environment variables/.env file.", file=sys.stderr)
+        return 1
+
+    if args.processes <= 1:
+        return run_process(args, token, 1.0)
+
+    share = 1 / args.processes
+    processes = [multiprocessing.Process(target=_process_main, args=(args, token, share))
+                 for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+    return max(process.exitcode or 0 for process in processes)
+
+
+if __name__ == '__main__':
+    sys.exit(main())